@@ -6,7 +6,12 @@ import random
 import time
 import os
 import os.path
+import sys
 import json
+import hashlib
+import heapq
+import bisect
+import numpy as np
 # for material
 from bpy_extras.node_shader_utils import PrincipledBSDFWrapper
 
@@ -16,7 +21,14 @@ from bpy_extras.node_shader_utils import PrincipledBSDFWrapper
 # Mido is a library for working with MIDI messages and ports.
 # It’s designed to be as straight forward and Pythonic as possible:
 # https://mido.readthedocs.io/en/latest/installing.html
-from mido import MidiFile
+# Mido is used by mtb_base to decode MIDI files
+
+# Modules of MTB are beside this script, they don't need Blender
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if script_dir not in sys.path:
+    sys.path.append(script_dir)
+from mtb_index import note_intervals, Interval_Class  # noqa: E402
+from mtb_base import MIDIBase_Class  # noqa: E402
 
 # Global blender objects
 b_dat = bpy.data
@@ -24,10 +36,13 @@ b_con = bpy.context
 b_scn = b_con.scene
 b_ops = bpy.ops
 
+# Version of script, part of channel fingerprints : a new version rebuild all channels
+mtb_version = "1.011"
+
 # ********************************************************************
 # Midi_To_Blend
 # version = 1.011
-# Blender version = 2.8
+# Blender version = 2.92 (attribute node of type object)
 # Author = Patrick Mauger
 # Web Site = docouatzat.com
 # Mail = docouatzat@gmail.com
@@ -66,11 +81,8 @@ def create_collection(collection_name, parent_collection, delete):
                             obj         The new collection created
     """
     if collection_name in b_dat.collections:
-        collection = b_dat.collections[collection_name]
         if delete:
-            for ob in collection.objects:
-                b_dat.objects.remove(ob, do_unlink=True)
-            b_dat.collections.remove(collection)
+            delete_collection(collection_name)
         else:
             return b_dat.collections[collection_name]
     new_collection = b_dat.collections.new(collection_name)
@@ -78,6 +90,85 @@ def create_collection(collection_name, parent_collection, delete):
     return new_collection
 
 
+# Types of datablocks generated by channels, see tag_owner
+owner_datablocks = (
+    "objects", "meshes", "materials", "textures", "particles", "lights", "metaballs", "curves",
+    "images", "actions", "cache_files", "node_groups", "collections"
+)
+
+
+def snapshot_datablocks():
+    """ Names of all datablocks of types owner_datablocks, to find later the new ones
+    Names are unique by type, pointers are not : memory of a datablock removed can be reused
+    """
+    return {name: {id_data.name_full for id_data in getattr(b_dat, name)} for name in owner_datablocks}
+
+
+def tag_owner(snapshot, owner):
+    """ Tag with his owner all datablocks created since the snapshot
+    IN
+        snapshot    dict    see snapshot_datablocks
+        owner       str     name of collection of channel
+    OUT
+        None
+    """
+    for name in owner_datablocks:
+        for id_data in getattr(b_dat, name):
+            if id_data.name_full not in snapshot[name] and not id_data.library:
+                id_data['mtb_owner'] = owner
+    return None
+
+
+def tag_owner_actions():
+    """ Tag the actions created by keyframes with the owner of the datablock animated """
+    for name in owner_datablocks:
+        for id_data in getattr(b_dat, name):
+            owner = id_data.get('mtb_owner')
+            if owner is None:
+                continue
+            # Datablock itself, his nodes and his shape keys
+            animated = [id_data, getattr(id_data, 'node_tree', None), getattr(id_data, 'shape_keys', None)]
+            for anim in animated:
+                anim_data = getattr(anim, 'animation_data', None)
+                if anim_data and anim_data.action and not anim_data.action.library:
+                    anim_data.action['mtb_owner'] = owner
+    return None
+
+
+def delete_collection(collection_name):
+    """ Delete a collection and all datablocks generated with it, if exist
+    All datablocks tagged with the collection as owner are removed in one call
+    IN
+        collection_name     str         The name of collection
+    OUT
+        None
+    """
+    collection = b_dat.collections.get(collection_name)
+    if collection and collection.library:
+        # Linked from a cache, remove the whole library
+        b_dat.libraries.remove(collection.library)
+        return None
+
+    owned = set()
+    if collection:
+        owned.add(collection)
+        owned.update(collection.all_objects)
+    for name in owner_datablocks:
+        for id_data in getattr(b_dat, name):
+            if id_data.get('mtb_owner') == collection_name:
+                owned.add(id_data)
+    if not owned:
+        return None
+
+    freed = {}
+    for id_data in owned:
+        freed[id_data.id_type] = freed.get(id_data.id_type, 0) + 1
+    b_dat.batch_remove(owned)
+    print("Freed for {}: {}".format(
+        collection_name, ", ".join("{} {}".format(count, id_type.lower()) for id_type, count in sorted(freed.items()))))
+    return None
+
+
 def assign_to_collection(collect, obj):
     """ Assign an object to a collection
     IN
@@ -91,6 +182,23 @@ def assign_to_collection(collect, obj):
     collect_to_unlink.objects.unlink(obj)
 
 
+def assign_material(obj, material):
+    """ Assign a material to all slots of an object, linked to the object
+    The mesh keep his own materials, it can be a template shared by others
+    IN
+        obj         obj     object
+        material    obj     material
+    OUT
+        None
+    """
+    if not obj.material_slots:
+        obj.data.materials.append(None)
+    for slot in obj.material_slots:
+        slot.link = 'OBJECT'
+        slot.material = material
+    return None
+
+
 def rgb_random_color():
     """
     Return a random color list for Red, Green, Blue
@@ -122,6 +230,115 @@ def Create_material_simple(name_of_color, r, g, b, rand):
     return mat
 
 
+def Create_material_emission(name_of_mat, attribute, strength):
+    """
+    Return an emission material shared by many objects
+    Emission strength is read on each object by a custom property
+    and emission color is the color of each object
+    IN
+        name_of_mat     str     The name of material
+        attribute       str     name of custom property of objects
+        strength        float   emission strength for a property equal to 1.0
+    OUT
+        material created
+    """
+    mat = b_dat.materials.new(name=name_of_mat)
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+    nodes.clear()
+
+    node_out = nodes.new('ShaderNodeOutputMaterial')
+    node_emission = nodes.new('ShaderNodeEmission')
+    node_info = nodes.new('ShaderNodeObjectInfo')
+    node_attribute = nodes.new('ShaderNodeAttribute')
+    node_attribute.attribute_type = 'OBJECT'
+    node_attribute.attribute_name = attribute
+    node_strength = nodes.new('ShaderNodeMath')
+    node_strength.operation = 'MULTIPLY'
+    node_strength.inputs[1].default_value = strength
+
+    links.new(node_attribute.outputs['Fac'], node_strength.inputs[0])
+    links.new(node_strength.outputs['Value'], node_emission.inputs['Strength'])
+    links.new(node_info.outputs['Color'], node_emission.inputs['Color'])
+    links.new(node_emission.outputs['Emission'], node_out.inputs['Surface'])
+
+    return mat
+
+
+def Create_material_atlas(name_of_mat, image, width, rows, per_object):
+    """
+    Return a material reading the state of his note into a note atlas
+    Pixel (frame, note) of the atlas is found with the current frame (driver)
+    and the note index, read on the object or on the geometry (uv map "note")
+    IN
+        name_of_mat     str     The name of material
+        image           obj     note atlas, see add_note_atlas
+        width           int     count of frames by row of atlas
+        rows            int     count of rows by note
+        per_object      bool    True = note index is the property "note" of object
+                                False = note index is the u of uv map "note"
+    OUT
+        material created
+    """
+    mat = b_dat.materials.new(name=name_of_mat)
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+
+    # Current frame, one driver for the whole material
+    # Clamped to the last pixel of the atlas, always silent, the scene can end after the song
+    node_frame = nodes.new('ShaderNodeValue')
+    fcurve = node_frame.outputs[0].driver_add("default_value")
+    fcurve.driver.expression = "min(max(frame, 0), {})".format(width * rows - 1)
+
+    node_note = nodes.new('ShaderNodeAttribute')
+    node_note.attribute_type = 'OBJECT' if per_object else 'GEOMETRY'
+    node_note.attribute_name = "note"
+    node_note_x = nodes.new('ShaderNodeSeparateXYZ')
+    links.new(node_note.outputs['Vector'], node_note_x.inputs[0])
+
+    def math_node(operation, input_0, value_1):
+        node = nodes.new('ShaderNodeMath')
+        node.operation = operation
+        links.new(input_0, node.inputs[0])
+        if isinstance(value_1, float):
+            node.inputs[1].default_value = value_1
+        else:
+            links.new(value_1, node.inputs[1])
+        return node.outputs[0]
+
+    # u = (frame mod width + 0.5) / width
+    u = math_node('MODULO', node_frame.outputs[0], float(width))
+    u = math_node('DIVIDE', math_node('ADD', u, 0.5), float(width))
+    # v = (note * rows + floor(frame / width) + 0.5) / (129 * rows)
+    row = math_node('FLOOR', math_node('DIVIDE', node_frame.outputs[0], float(width)), 0.0)
+    v = math_node('MULTIPLY', node_note_x.outputs['X'], float(rows))
+    v = math_node('DIVIDE', math_node('ADD', math_node('ADD', v, row), 0.5), float(129 * rows))
+
+    node_uv = nodes.new('ShaderNodeCombineXYZ')
+    links.new(u, node_uv.inputs['X'])
+    links.new(v, node_uv.inputs['Y'])
+    node_tex = nodes.new('ShaderNodeTexImage')
+    node_tex.image = image
+    node_tex.interpolation = 'Closest'
+    node_tex.extension = 'EXTEND'
+    links.new(node_uv.outputs[0], node_tex.inputs['Vector'])
+
+    # Surface glow following velocity of his note
+    principled = PrincipledBSDFWrapper(mat, is_readonly=False)
+    principled.base_color = rgb_random_color()
+    node_emission = nodes.new('ShaderNodeEmission')
+    node_emission.inputs['Color'].default_value = principled.base_color[:] + (1.0,)
+    links.new(math_node('MULTIPLY', node_tex.outputs['Color'], 10.0), node_emission.inputs['Strength'])
+    node_add = nodes.new('ShaderNodeAddShader')
+    links.new(nodes['Principled BSDF'].outputs['BSDF'], node_add.inputs[0])
+    links.new(node_emission.outputs['Emission'], node_add.inputs[1])
+    links.new(node_add.outputs['Shader'], nodes['Material Output'].inputs['Surface'])
+
+    return mat
+
+
 def add_empty(collect, name_of_empty, location):
     """ Create an empty
     IN
@@ -155,11 +372,6 @@ def duplicate_linked(collect, name, location, model):
         obj = model.copy()
         obj.name = name
         obj.location = location
-
-        # add properties to all objects/notes and fix it to frame 0
-        obj['velocity'] = 0
-        obj.keyframe_insert(data_path="""["velocity"]""", frame=0)
-
         collect.objects.link(obj)
     return obj
 
@@ -171,6 +383,122 @@ def apply_modifiers(obj, scene, render=False):  # Bug
     obj.modifiers.clear()
 
 
+def add_proxy_mesh(mesh, max_verts):
+    """ Create a low-poly proxy of a mesh, convex hull of some of his vertices
+    Both meshes are kept with a fake user and know each other by a property
+    IN
+        mesh        obj     mesh full quality
+        max_verts   int     max of vertices used for the proxy
+    OUT
+        The proxy mesh created
+    """
+    bm = bmesh.new()
+    step = max(1, len(mesh.vertices) // max_verts)
+    for v in mesh.vertices[::step]:
+        bm.verts.new(v.co)
+    bmesh.ops.convex_hull(bm, input=bm.verts)
+    proxy = b_dat.meshes.new(mesh.name + "_proxy")
+    bm.to_mesh(proxy)
+    bm.free()
+    for mat in mesh.materials:
+        proxy.materials.append(mat)
+
+    mesh['mtb_proxy'] = proxy.name
+    proxy['mtb_full'] = mesh.name
+    # Proxy is created after the build, he belong to the owner of his mesh, see tag_owner
+    if 'mtb_owner' in mesh:
+        proxy['mtb_owner'] = mesh['mtb_owner']
+    mesh.use_fake_user = True
+    proxy.use_fake_user = True
+
+    return proxy
+
+
+def quality_objects(collection):
+    """ Objects of a collection and of collections instanced (LT lampshades)
+    A channel collection allow proxies following his type, see quality_proxy
+    IN
+        collection  obj     collection
+    OUT
+        dict    {object: True if a proxy is allowed}
+    """
+    objects = {}
+    cols = [collection]
+    for col in cols:
+        cols.extend(child for child in col.children if child not in cols)
+    for col in cols:
+        proxy = col.get('mtb_type') in quality_proxy
+        for obj in col.all_objects:
+            objects[obj] = objects.get(obj, False) or proxy
+    for obj, proxy in list(objects.items()):
+        if obj.instance_type == 'COLLECTION' and obj.instance_collection:
+            for obj_inst in obj.instance_collection.all_objects:
+                objects[obj_inst] = objects.get(obj_inst, False) or proxy
+    return objects
+
+
+def set_quality_display(obj, preview):
+    """ Swap modifiers, particles and metaballs of an object between preview and final quality """
+    for mod in obj.modifiers:
+        if mod.type in ('SUBSURF', 'BEVEL', 'DISPLACE'):
+            mod.show_viewport = not preview
+    for ps in obj.particle_systems:
+        if ps.settings.type == 'HAIR':
+            ps.settings.display_percentage = 0 if preview else 100
+        else:
+            ps.settings.display_percentage = 10 if preview else 100
+    if obj.type == 'META':
+        obj.data.resolution = 1.0 if preview else 0.25
+    return None
+
+
+def set_quality_proxy(obj, preview):
+    """ Swap the mesh of an object between his proxy and his full mesh
+    Proxy only for heavy meshes never deformed by vertex groups, hooks, shape keys or caches
+    """
+    if obj.type != 'MESH' or obj.data.shape_keys or obj.vertex_groups:
+        return None
+    if any(mod.type in ('HOOK', 'ARMATURE', 'MESH_SEQUENCE_CACHE') for mod in obj.modifiers):
+        return None
+    if preview and 'mtb_full' not in obj.data:
+        if 'mtb_proxy' not in obj.data:
+            if len(obj.data.polygons) <= 256:
+                return None
+            add_proxy_mesh(obj.data, 64)
+        # All objects using the full mesh use now the proxy
+        obj.data.user_remap(b_dat.meshes[obj.data['mtb_proxy']])
+    elif not preview and 'mtb_full' in obj.data:
+        obj.data.user_remap(b_dat.meshes[obj.data['mtb_full']])
+    return None
+
+
+def set_quality(collection, quality):
+    """ Swap all objects of a collection between preview and final quality
+    Only display is changed, never the animation, so it can be done at any time
+    preview     heavy modifiers disabled in viewport, particles display reduced,
+                no hair, coarse metaballs and proxy meshes for heavy meshes
+                of the channel types listed into quality_proxy
+    final       everything back to full quality
+    From python console : bpy.app.driver_namespace["mtb_set_quality"](collection, "final")
+    IN
+        collection  obj     collection, mean all objects generated
+        quality     str     "preview" or "final"
+    OUT
+        None
+    """
+    preview = quality == "preview"
+
+    for obj, proxy in quality_objects(collection).items():
+        # Linked objects from a cache keep the quality of their build
+        if obj.library:
+            continue
+        set_quality_display(obj, preview)
+        if proxy:
+            set_quality_proxy(obj, preview)
+
+    return None
+
+
 def add_VBO_grid(collect, parent, material, location, sx, sy, list_note, note_object):
     """ Create a Grid Mesh and 127 empty hooked to 127 faces
     IN
@@ -202,7 +530,7 @@ def add_VBO_grid(collect, parent, material, location, sx, sy, list_note, note_ob
         if x not in list_note:
             continue
         # Math to distribute hooks with harmony on faces
-        num_face = ((x * 3 - 2) + ((((x - 1) // 12) + 1) * 72)) - 36
+        num_face = grid_face_of_note(x)
         # Select vertice
         fc = b_dat.meshes[me.name].polygons[num_face]
         verts_in_face = fc.vertices[:]
@@ -224,6 +552,100 @@ def add_VBO_grid(collect, parent, material, location, sx, sy, list_note, note_ob
     return o
 
 
+def grid_face_of_note(note):
+    """ Return the face of the grid 37x34 used by a note
+    IN
+        note        int     note number (1-126)
+    OUT
+        int         index of polygon
+    """
+    return ((note * 3 - 2) + ((((note - 1) // 12) + 1) * 72)) - 36
+
+
+def add_VBO_grid_sk(collect, parent, material, location, sx, sy, list_note):
+    """ Create a Grid Mesh with one shape key by used note on respective face
+    All notes are mixed by the shape keys in one pass, no hook modifier needed
+    IN
+        collect         obj     collection
+        parent          obj     empty parent
+        location        float   coordinates
+        mat             obj     material
+        sx              int     subdivisions x
+        sy              int     subdivisions y
+        list_note       list    list of used notes
+    OUT
+        The object grid created
+    """
+    o = add_VBO(
+        Type="Grid",
+        Col=collect,
+        Name=collect.name,
+        Mat=material,
+        Size=64.0,
+        Location=location,
+        X_Seg=sx,
+        Y_Seg=sy,
+        Parent=parent
+    )
+
+    # Add a shape key for each note used on respective face
+    # Value 1.0 mean velocity 127, same rise than hooks (velocity / 6)
+    me = o.data
+    o.shape_key_add(name="Basis", from_mix=False)
+    for x in range(1, 127):
+        if x not in list_note:
+            continue
+        verts_in_face = me.polygons[grid_face_of_note(x)].vertices[:]
+        sk = o.shape_key_add(name=collect.name + "_" + str(x), from_mix=False)
+        for v in verts_in_face:
+            sk.data[v].co.z += 127 / 6
+
+    return o
+
+
+def add_VBO_bars(collect, name, parent, material, places):
+    """ Create all bars of a bargraph into one mesh, one shape key by note
+    A shape key at 1.0 mean velocity 127, same height than a bar scaled
+    IN
+        collect     obj     collection
+        name        str     name of created object
+        parent      obj     empty parent
+        material    obj     material
+        places      dict    {note: x} place of each bar
+    OUT
+        The object bars created
+    """
+    bm = bmesh.new()
+    bars = {}  # {note: verts of bar}
+    for note, x in places.items():
+        bars[note] = bmesh.ops.create_cube(bm, size=2.0, matrix=mathutils.Matrix.Translation((x, 0.0, 0.0)))['verts']
+
+    mesh = b_dat.meshes.new(name)
+    bm.verts.index_update()
+    bars = {note: [v.index for v in verts] for note, verts in bars.items()}
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = b_dat.objects.new(name, mesh)
+    b_con.scene.collection.objects.link(obj)
+    obj.parent = parent
+    obj.data.materials.append(material)
+    mod = obj.modifiers.new(name="Bevel", type='BEVEL')
+    mod.width = 0.1
+
+    # Bottom of bar is fixed, top rise of velocity / 8
+    obj.shape_key_add(name="Basis", from_mix=False)
+    for note, verts in bars.items():
+        sk = obj.shape_key_add(name=name + "_" + str(note), from_mix=False)
+        for v in verts:
+            if mesh.vertices[v].co.z > 0:
+                sk.data[v].co.z += 127 / 8
+
+    assign_to_collection(collect, obj)
+
+    return obj
+
+
 def add_VBO_light(collect, name, location, parent):
     """ Create a Light
     IN
@@ -331,7 +753,7 @@ def add_VBO(**kwargs):
     collect = kwargs.get("Col", "Error Col needed")
     parent = kwargs.get("Parent", "Error Parent needed")
     name = kwargs.get("Name", "NotNamed")
-    mat = kwargs.get("Mat", Create_material_simple(name + "mat", 0, 0, 0, True))
+    mat = kwargs["Mat"] if "Mat" in kwargs else Create_material_simple(name + "mat", 0, 0, 0, True)
     size = kwargs.get("Size", 1.0)
     location = kwargs.get("Location", (0.0, 0.0, 0.0))
     scale = kwargs.get("Scale", (1.0, 1.0, 1.0))
@@ -401,37 +823,458 @@ def search_channel_in_mtb_data(id):
     return None
 
 
+""" ========================= Planning functions ========================= """
+
+
+def scan_note_events(messages, frames, use_channel):
+    """ Pre-scan all note events of midifile, before any dispatch
+    Same rules than main loop : note_on with velocity 0 become note_off
+    IN
+        messages        list    message table, see MIDISong_Class
+        frames          list    frame of each message
+        use_channel     bool    True = channel from msg, False = 1 track = 1 channel
+    OUT
+        dict    {channel: [[frame, note, velocity], ...]} sorted by frame
+    """
+    l_events = {}
+    for (current_track, ticks, msg_type, channel, note, velocity), frame in zip(messages, frames):
+        if msg_type not in ('note_on', 'note_off'):
+            continue
+        if use_channel:
+            current_channel = channel
+        else:
+            current_channel = current_track
+        velocity = velocity * (msg_type == 'note_on')  # to avoid note_off with velocity != 0
+        l_events.setdefault(current_channel, []).append([frame, note, velocity])
+
+    # A channel can be spread over many tracks
+    for events in l_events.values():
+        events.sort(key=lambda evt: evt[0])
+
+    return l_events
+
+
+def window_frame(value, unit, time_map, ticks_per_bar):
+    """ Frame of a limit of time window
+    IN
+        value           float   limit of window
+        unit            str     "seconds", "bars" (first bar = 1) or "frames"
+        time_map        obj     Tempo_Class
+        ticks_per_bar   int     ticks of a bar, with the first time signature
+    OUT
+        float   frame
+    """
+    if unit == "seconds":
+        return value * framerate
+    if unit == "bars":
+        return time_map.frame((value - 1) * ticks_per_bar)
+    return value
+
+
+def window_messages(messages, frames, frame_start, frame_end):
+    """ Keep only the messages of a time window [frame_start, frame_end]
+    Notes held at frame_start and last values of controls before it are seeded at frame_start,
+    notes still held at frame_end are closed there
+    IN
+        messages        list    message table, see MIDISong_Class
+        frames          list    frame of each message
+        frame_start     float   first frame of window
+        frame_end       float   last frame of window
+    OUT
+        list    messages of window, in the order of tracks
+        list    frame of each message
+    """
+    held = {}       # notes sounding {(track, channel, note): message note_on}
+    controls = {}   # last value of controls {(track, channel, type, control): message}
+    inside = []
+
+    def hold(msg):
+        track, ticks, msg_type, channel, note, velocity = msg
+        if msg_type == 'note_on' and velocity > 0:
+            held[(track, channel, note)] = msg
+        else:
+            held.pop((track, channel, note), None)
+
+    for msg, frame in zip(messages, frames):
+        track, ticks, msg_type, channel, data1, data2 = msg
+        if msg_type == 'set_tempo' or frame > frame_end:
+            continue
+        if frame >= frame_start:
+            inside.append((msg, frame))
+        elif msg_type in ('note_on', 'note_off'):
+            hold(msg)
+        elif msg_type in ('pitchwheel', 'aftertouch'):
+            controls[(track, channel, msg_type, 0)] = msg
+        elif msg_type == 'control_change':
+            controls[(track, channel, msg_type, data1)] = msg
+
+    # State at frame_start, then events of window, then notes still held closed at frame_end
+    window = [(msg, frame_start) for msg in controls.values()]
+    window += [(msg, frame_start) for msg in held.values()]
+    for msg, frame in inside:
+        if msg[2] in ('note_on', 'note_off'):
+            hold(msg)
+    window += inside
+    window += [((msg[0], msg[1], 'note_off', msg[3], msg[4], 0), frame_end) for msg in held.values()]
+
+    # Stable sort : in the order of tracks, then of frames
+    window.sort(key=lambda item: (item[0][0], item[1]))
+    return [msg for msg, frame in window], [frame for msg, frame in window]
+
+
+def channel_fingerprint(channel, events, list_note, settings):
+    """ Fingerprint of everything used to build a channel
+    IN
+        channel     dict    config of channel from JSON
+        events      list    [[frame, note, velocity], ...] of channel
+        list_note   list    notes used by channel
+        settings    list    global settings used by channels (version, fps, ...)
+    OUT
+        str     sha1 in hexa
+    """
+    content = json.dumps([channel, events, list_note, settings], sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def scene_fingerprint(files, settings):
+    """ Fingerprint of a whole build, key of the scene cache
+    IN
+        files       list    path of input files (MIDI, JSON)
+        settings    list    global settings of build (version, fps, quality, ...)
+    OUT
+        str     sha1 in hexa
+    """
+    sha = hashlib.sha1()
+    for file in files:
+        with open(file, 'rb') as f:
+            sha.update(f.read())
+    sha.update(json.dumps(settings).encode())
+    return sha.hexdigest()
+
+
+def note_state_matrix(events, count_frames):
+    """ Velocity of each note for each frame, following note intervals
+    IN
+        events          list    [[frame, note, velocity], ...] sorted by frame
+        count_frames    int     count of frames of the matrix
+    OUT
+        array   float32 (128 notes, count_frames), velocity 0-127 held by note
+    """
+    state = np.zeros((128, count_frames), dtype=np.float32)
+    for note, frame_on, frame_off, velocity in note_intervals(events):
+        state[note, max(0, math.ceil(frame_on)):max(0, math.ceil(frame_off))] = velocity
+    return state
+
+
+def add_note_atlas(name, events):
+    """ Bake the velocity of each note for each frame into an image, the note atlas
+    One pixel by note and by frame, value = velocity / 127 into red, green and blue
+    A long song is wrapped on many rows by note, to respect max size of textures
+    The last note (128) is always silent, used by faces without note
+    IN
+        name        str     name of image
+        events      list    [[frame, note, velocity], ...] sorted by frame
+    OUT
+        obj     image created
+        int     count of frames by row
+        int     count of rows by note
+    """
+    count_frames = int(max([evt[0] for evt in events], default=0)) + 2
+    width = min(count_frames, 16384)
+    rows = -(-count_frames // width)
+
+    state = np.zeros((129, rows * width), dtype=np.float32)
+    state[:128, :count_frames] = note_state_matrix(events, count_frames) / 127
+    state = state.reshape(129 * rows, width)
+
+    pixels = np.ones((129 * rows, width, 4), dtype=np.float32)
+    pixels[:, :, :3] = state[:, :, np.newaxis]
+
+    image = b_dat.images.new(name=name, width=width, height=129 * rows, float_buffer=True)
+    image.pixels.foreach_set(pixels.ravel())
+    image.pack()
+
+    return image, width, rows
+
+
+def pool_schedule(windows):
+    """ Interval scheduling of windows on a pool of reusable slots
+    A slot is free again when the end of his last window is passed
+    IN
+        windows     list    [[start, end], ...] sorted by start
+    OUT
+        list    slot index for each window
+        int     size of pool, mean the max of overlapping windows
+    """
+    slots = []
+    busy = []  # heap of [end, slot]
+    size = 0
+    for start, end in windows:
+        if busy and busy[0][0] < start:
+            slot = heapq.heappop(busy)[1]
+        else:
+            slot = size
+            size += 1
+        heapq.heappush(busy, [end, slot])
+        slots.append(slot)
+    return slots, size
+
+
+def set_interpolation(id_data, interpolation='CONSTANT'):
+    """ Set all keyframes of an animated datablock to one interpolation
+    IN
+        id_data         obj     Any datablock animated (object, particle settings, ...)
+        interpolation   str     'CONSTANT', 'LINEAR' or 'BEZIER'
+    OUT
+        None
+    """
+    if id_data.animation_data and id_data.animation_data.action:
+        for fc in id_data.animation_data.action.fcurves:
+            for kp in fc.keyframe_points:
+                kp.interpolation = interpolation
+    return None
+
+
+def FT_live_particles(bursts, count_scale, lifetime):
+    """ Count of live particles by frame for bursts of fountains
+    Particles of a burst are emitted regularly from frame_on to frame_off
+    and each particle live during lifetime
+    IN
+        bursts          array   [[frame_on, frame_off, velocity], ...]
+        count_scale     float   scale applied to count of particles (velocity * 2)
+        lifetime        float   lifetime of particles in frames
+    OUT
+        array   count of live particles by frame
+    """
+    lifetime = max(1, int(round(lifetime)))
+    frame_on = np.floor(bursts[:, 0]).astype(int)
+    frame_off = np.maximum(frame_on + 1, np.ceil(bursts[:, 1]).astype(int))
+    origin = frame_on.min()
+    frame_on -= origin
+    frame_off -= origin
+    rate = np.maximum(1, np.floor(bursts[:, 2] * 2 * count_scale)) / (frame_off - frame_on)
+
+    # Particles emitted by frame, then live = emitted during the last lifetime frames
+    delta = np.zeros(frame_off.max() + lifetime + 1)
+    np.add.at(delta, frame_on, rate)
+    np.add.at(delta, frame_off, -rate)
+    emitted = np.cumsum(np.cumsum(delta))
+    live = emitted.copy()
+    live[lifetime:] -= emitted[:-lifetime]
+
+    return live
+
+
+def FT_plan_budget(l_ft_events, budget, mode):
+    """ Planning of particles for all FT channels before any simulation
+    Sweep all emission windows, count live particles by frame and scale down
+    count or lifetime of particles to respect a global budget
+    IN
+        l_ft_events     list    list of events of each FT channel
+        budget          int     max of live particles, 0 mean no limit
+        mode            str     'COUNT' or 'LIFETIME', the parameter scaled
+    OUT
+        float   scale of count of particles
+        float   scale of lifetime of particles
+    """
+    bursts = [itv[1:] for events in l_ft_events for itv in note_intervals(events)]
+    if not bursts:
+        return 1.0, 1.0
+    bursts = np.array(bursts, dtype=np.float64)
+
+    lifetime = framerate * 20
+    live = FT_live_particles(bursts, 1.0, lifetime)
+    print("FT particles peak = {:.0f} live particles, budget = {}".format(live.max(), budget))
+    if budget <= 0 or live.max() <= budget:
+        return 1.0, 1.0
+
+    # Live particles are proportional to count
+    if mode == "COUNT":
+        count_scale = budget / live.max()
+        print("FT particles count scaled by {:.3f}".format(count_scale))
+        return count_scale, 1.0
+
+    # Live particles grow with lifetime, search the scale by dichotomy
+    low, high = 0.0, 1.0
+    for i in range(20):
+        middle = (low + high) / 2
+        if FT_live_particles(bursts, 1.0, lifetime * middle).max() > budget:
+            high = middle
+        else:
+            low = middle
+    print("FT particles lifetime scaled by {:.3f}".format(low))
+    return 1.0, low
+
+
+def runtime_velocity(frames, velocities, frame, curve):
+    """ Velocity of a note at any frame, from his sorted list of changes
+    Same ramp than keyed animation, each change start curve frames before his event
+    IN
+        frames      list    frames of changes, sorted
+        velocities  list    velocity of each change
+        frame       float   current frame
+        curve       int     count of frames of the ramp
+    OUT
+        float   velocity
+    """
+    j = bisect.bisect_right(frames, frame)
+    before = velocities[j - 1] if j else 0
+    if j == len(frames) or curve <= 0 or frame <= frames[j] - curve:
+        return before
+    t = (frame - frames[j] + curve) / curve
+    t = t * t * (3 - 2 * t)
+    return before + (velocities[j] - before) * t
+
+
+def runtime_load(scene):
+    """ Data of runtime channels stored into the scene, see Channel_set_runtime
+    Converted once to python types, read by the handler at each frame
+    IN
+        scene       obj     scene
+    OUT
+        dict    {channel: data of runtime channel}
+    """
+    runtimes = {}
+    for key, runtime in scene.get("mtb_runtime", {}).items():
+        runtime = runtime.to_dict()
+        runtime["notes"] = {int(note): entry for note, entry in runtime["notes"].items()}
+        runtimes[key] = runtime
+    return runtimes
+
+
+@bpy.app.handlers.persistent
+def runtime_frame_change(scene, depsgraph=None):
+    """ Handler frame_change_pre of runtime mode
+    Set the state of all notes of runtime channels for the current frame, without any keyframe
+    Data of channels are into the scene, loaded into bpy.app.driver_namespace["mtb_runtime"]
+    """
+    if "mtb_runtime" not in bpy.app.driver_namespace:
+        bpy.app.driver_namespace["mtb_runtime"] = runtime_load(scene)
+    frame = scene.frame_current_final
+    objects = b_dat.objects
+    for runtime in bpy.app.driver_namespace["mtb_runtime"].values():
+        visual_type = runtime["type"]
+        backend = runtime["backend"]
+        obj_channel = objects.get(runtime["channel"])
+        for note, entry in runtime["notes"].items():
+            obj = objects.get(entry["object"])
+            if obj is None:
+                continue
+            velocity = runtime_velocity(entry["frames"], entry["velocities"], frame, runtime["curve"])
+            if obj_channel is not None:
+                obj_channel['velocity'][note] = velocity
+            if visual_type in ("BG", "GD") and backend == "SHAPEKEY":
+                obj.data.shape_keys.key_blocks[obj.name + "_" + str(note)].value = velocity / 127
+            elif visual_type == "BG":
+                obj.scale[2] = (velocity / 16) + 1.0
+                obj.location[2] = entry["base"] + velocity / 16
+            elif visual_type == "GD":
+                obj.location[2] = entry["base"] + velocity / 6
+            elif visual_type == "LT" and backend == "EMISSION":
+                obj['energy'] = velocity / 127
+                light = objects.get(entry.get("light", ""))
+                if light is not None:
+                    light.data.energy = velocity * 1000
+            elif visual_type == "LT":
+                obj.data.energy = velocity * 1000
+            elif visual_type == "PB":
+                obj.modifiers[1].strength = (velocity / 127) * 5
+
+    return None
+
+
+@bpy.app.handlers.persistent
+def runtime_load_post(*args):
+    """ Handler load_post of runtime mode
+    A file saved with runtime channels is animated again once loaded, into the same
+    session of Blender only : a new session need to run the script again
+    """
+    bpy.app.driver_namespace["mtb_runtime"] = runtime_load(bpy.context.scene)
+    runtime_register()
+    return None
+
+
+def runtime_register():
+    """ Register the handlers of runtime mode, only once
+    frame_change_pre only if there is runtime channels, load_post always
+    """
+    for handlers, handler in ((bpy.app.handlers.frame_change_pre, runtime_frame_change),
+                              (bpy.app.handlers.load_post, runtime_load_post)):
+        for h in [h for h in handlers if h.__name__ == handler.__name__]:
+            handlers.remove(h)
+    if bpy.app.driver_namespace.get("mtb_runtime"):
+        bpy.app.handlers.frame_change_pre.append(runtime_frame_change)
+    bpy.app.handlers.load_post.append(runtime_load_post)
+    return None
+
+
+def keyframes_bulk(id_data, data_path, index, co, interpolation, handle_left=None, handle_right=None):
+    """ Insert all keyframes of a fcurve in one call, without keyframe_insert
+    IN
+        id_data         obj     datablock to animate
+        data_path       str     path of property animated
+        index           int     index of property if array, else 0
+        co              array   [[frame, value], ...] sorted by frame
+        interpolation   list    interpolation of each keyframe ('CONSTANT', 'LINEAR', 'BEZIER')
+        handle_left     array   [[frame, value], ...] free handles or None for automatic handles
+        handle_right    array   [[frame, value], ...] free handles or None for automatic handles
+    OUT
+        The fcurve created
+    """
+    if not id_data.animation_data:
+        id_data.animation_data_create()
+    if not id_data.animation_data.action:
+        id_data.animation_data.action = b_dat.actions.new(id_data.name + "Action")
+    fcurves = id_data.animation_data.action.fcurves
+
+    fc = fcurves.find(data_path, index=index)
+    if fc:
+        fcurves.remove(fc)
+    fc = fcurves.new(data_path, index=index)
+    fc.keyframe_points.add(len(co))
+    fc.keyframe_points.foreach_set('co', np.asarray(co, dtype=np.float32).ravel())
+    for kp, interp in zip(fc.keyframe_points, interpolation):
+        kp.interpolation = interp
+        if handle_left is not None:
+            kp.handle_left_type = 'FREE'
+            kp.handle_right_type = 'FREE'
+    if handle_left is not None:
+        fc.keyframe_points.foreach_set('handle_left', np.asarray(handle_left, dtype=np.float32).ravel())
+        fc.keyframe_points.foreach_set('handle_right', np.asarray(handle_right, dtype=np.float32).ravel())
+    fc.update()
+
+    return fc
+
+
 """ ========================= Class ========================= """
 
 
 class Tempo_Class:
 
     # Channel initializations
-    def __init__(self, track_to_analyze):
+    def __init__(self, messages):
         """
         Initialization of the Class Tempo_MAP
         IN
-            Track carrying the tempo instructions
+            Message table, the tempo instructions are into the track 0
         OUT
             The new object instanciated
             The tempo MAP is initialized with instanciation
         """
         # Parameters
-        self.track = track_to_analyze       # track to analyze, always the track 0 for midi type 0 & 1
+        self.track = 0                      # track to analyze, always the track 0 for midi type 0 & 1
         self.tempo_map = [[]]               # 2D Matrice contain usefull data
 
-        time_in_ticks_cumul = 0
         ticks_previous = 0
         tempo_previous = 0
         sec_cumul = 0
 
         # Generate the tempo MAP for the track
-        for msg in self.track:
-            time_in_ticks_cumul += msg.time
-            if msg.type == 'set_tempo':
-                if msg.tempo != 0:
+        for current_track, time_in_ticks_cumul, msg_type, channel, data1, data2 in messages:
+            if current_track == self.track and msg_type == 'set_tempo':
+                if data1 != 0:
                     row = []
-                    tempo = msg.tempo
+                    tempo = data1
                     bpm = int(60000/(tempo/1000))
                     delta_ticks = time_in_ticks_cumul - ticks_previous
                     sec_per_ticks = (tempo_previous / ppq) / 1000000
@@ -480,6 +1323,18 @@ def Channel_is_BG(self, col_obj, empty_parent, material):
     """
     Instanciate with a channel typed : BG - BarGraphs
     """
+    # One object for all bars, one shape key by note
+    if self.backend == "SHAPEKEY":
+        places = {}
+        median_place = self.count_place // 2
+        for x in self.list_note:
+            places[x] = ((x - self.min_note) - median_place) * self.cf
+        obj_bars = add_VBO_bars(col_obj, col_obj.name, empty_parent, material, places)
+        for x in self.list_note:
+            self.note_object[x] = obj_bars
+        self.note_object[128] = obj_bars
+        return None
+
     # Create template
     if self.template != "":
         obj_model = b_dat.objects.get(self.template)
@@ -527,13 +1382,17 @@ def BG_note_evt(self, obj, frame, note, velocity):
     # To avoid bargraphs slowly grow before the note
     if velocity != self.last_note_status[note]:
         BG_note_evt(self, obj, frame - self.curve, note, self.last_note_status[note])
-    obj.scale = 1.0, 1.0, (velocity / 16) + 1.0
-    obj.keyframe_insert(data_path='scale', frame=frame)
-    vel = velocity - self.last_note_status[note]
-    vec = mathutils.Vector((0.0, 0.0, vel / 16))
-    obj.location = obj.location + vec
-    obj.keyframe_insert(data_path='location', frame=frame)
-    obj.keyframe_insert(data_path="""["velocity"]""", frame=frame)
+    if self.backend == "SHAPEKEY":
+        sk = obj.data.shape_keys.key_blocks[obj.name + "_" + str(note)]
+        sk.value = velocity / 127
+        sk.keyframe_insert(data_path='value', frame=frame)
+    else:
+        obj.scale = 1.0, 1.0, (velocity / 16) + 1.0
+        obj.keyframe_insert(data_path='scale', frame=frame)
+        vel = velocity - self.last_note_status[note]
+        vec = mathutils.Vector((0.0, 0.0, vel / 16))
+        obj.location = obj.location + vec
+        obj.keyframe_insert(data_path='location', frame=frame)
     self.last_note_status[note] = velocity
     return None
 
@@ -543,16 +1402,31 @@ def Channel_is_GD(self, col_obj, empty_parent, material):
     Instanciate with a channel typed : GD - Grid
     """
     # Create grid x = (12x3) + 1) et y = (11*3) + 1 => (12*11 = 132 notes)
-    obj_master = add_VBO_grid(
-        collect=col_obj,
-        parent=empty_parent,
-        material=material,
-        location=(0, 0, 0),
-        sx=37,
-        sy=34,
-        list_note=self.list_note,
-        note_object=self.note_object
-    )
+    if self.backend == "SHAPEKEY":
+        # One shape key by note, the grid itself is animated for all notes
+        obj_master = add_VBO_grid_sk(
+            collect=col_obj,
+            parent=empty_parent,
+            material=material,
+            location=(0, 0, 0),
+            sx=37,
+            sy=34,
+            list_note=self.list_note
+        )
+        for x in range(1, 127):
+            if x in self.list_note:
+                self.note_object[x] = obj_master
+    else:
+        obj_master = add_VBO_grid(
+            collect=col_obj,
+            parent=empty_parent,
+            material=material,
+            location=(0, 0, 0),
+            sx=37,
+            sy=34,
+            list_note=self.list_note,
+            note_object=self.note_object
+        )
 
     self.note_object[128] = obj_master
 
@@ -571,10 +1445,15 @@ def GD_note_evt(self, obj, frame, note, velocity):
     """
     if velocity != self.last_note_status[note]:
         GD_note_evt(self, obj, frame - self.curve, note, self.last_note_status[note])
-    vel = velocity - self.last_note_status[note]
-    vec = mathutils.Vector((0.0, 0.0, vel / 6))
-    obj.location = obj.location + vec
-    obj.keyframe_insert(data_path='location', frame=frame)
+    if self.backend == "SHAPEKEY":
+        sk = obj.data.shape_keys.key_blocks[obj.name + "_" + str(note)]
+        sk.value = velocity / 127
+        sk.keyframe_insert(data_path='value', frame=frame)
+    else:
+        vel = velocity - self.last_note_status[note]
+        vec = mathutils.Vector((0.0, 0.0, vel / 6))
+        obj.location = obj.location + vec
+        obj.keyframe_insert(data_path='location', frame=frame)
     self.last_note_status[note] = velocity
     return None
 
@@ -595,43 +1474,84 @@ def Channel_is_LT(self, col_obj, empty_parent):
         Parent=empty_parent
     )
 
+    # Create the lampshade only once, with his hair, into a collection
+    # This collection is unlinked from the scene, each note instance it
+    col_lampshade = create_collection(col_obj.name + "_Lampshade", col_obj, delete=True)
+    col_obj.children.unlink(col_lampshade)
+    obj_ics = add_VBO(
+        Type="IcoSphere",
+        Col=col_lampshade,
+        Name=col_obj.name + "_Lampshade",
+        Mat=mat_drak_grey,
+        Subdivisions=4,
+        Diameter=4.0,
+        Parent=None
+    )
+    # add particle system hair to the icosphere
+    ps = obj_ics.modifiers.new(name='particles', type='PARTICLE_SYSTEM')
+    ps = obj_ics.particle_systems
+    name_of_ps = col_obj.name + "_PS_LS"
+    ps.active.name = name_of_ps
+    ps.active.settings.type = 'HAIR'
+    ps.active.settings.emit_from = 'VERT'
+    ps.active.settings.render_type = 'OBJECT'
+    ps.active.settings.instance_object = obj_model_part
+    ps.active.settings.count = 1000
+    ps.active.settings.hair_length = 10
+    ps.active.settings.hair_step = 2
+    obj_ics.show_instancer_for_viewport = False
+    obj_ics.show_instancer_for_render = False
+#    ps.active.settings.show_instancer_for_render = False
+#    ps.active.settings.show_instancer_for_viewport = False
+
+    if self.backend == "EMISSION":
+        # One emissive bulb by note, all share the same material
+        mat_emission = Create_material_emission(col_obj.name + "_mat_emission", "energy", 20.0)
+        # Real lights only for the loudest notes, following the max of velocity
+        peak = {}
+        for frame, note, velocity in self.events:
+            peak[note] = max(peak.get(note, 0), velocity)
+        loudest = sorted(self.list_note, key=lambda note: peak.get(note, 0), reverse=True)[:self.lights]
+
     current_place = 0
     median_place = self.count_place // 2
     # Create one light by used note
     for x in range(self.min_note, self.max_note + 1):
         if x in self.list_note:
-            self.note_object[x] = add_VBO_light(
-                collect=col_obj,
-                name=col_obj.name + "_Light_" + str(x),
-                location=((current_place - median_place) * self.cf * 3, 0, 4),
-                parent=empty_parent)
-            # Create lampshade part hair
-            obj_ics = add_VBO(
-                Type="IcoSphere",
-                Col=col_obj,
-                Name=col_obj.name + "_Lampshade_" + str(x),
-                Mat=mat_drak_grey,
-                Location=((current_place - median_place) * self.cf * 3, 0, 4),
-                Subdivisions=4,
-                Diameter=4.0,
-                Parent=empty_parent
-            )
-            # add particle system hair to the icosphere
-            ps = obj_ics.modifiers.new(name='particles', type='PARTICLE_SYSTEM')
-            ps = obj_ics.particle_systems
-            name_of_ps = col_obj.name + "_PS_LS_" + str(x)
-            ps.active.name = name_of_ps
-            ps.active.settings.type = 'HAIR'
-            ps.active.settings.emit_from = 'VERT'
-            ps.active.settings.render_type = 'OBJECT'
-            ps.active.settings.instance_object = obj_model_part
-            ps.active.settings.count = 1000
-            ps.active.settings.hair_length = 10
-            ps.active.settings.hair_step = 2
-            obj_ics.show_instancer_for_viewport = False
-            obj_ics.show_instancer_for_render = False
-#            ps.active.settings.show_instancer_for_render = False
-#            ps.active.settings.show_instancer_for_viewport = False
+            location = ((current_place - median_place) * self.cf * 3, 0, 4)
+            if self.backend == "EMISSION":
+                obj_bulb = add_VBO(
+                    Type="UVSphere",
+                    Col=col_obj,
+                    Name=col_obj.name + "_Bulb_" + str(x),
+                    Mat=mat_emission,
+                    U_Seg=16,
+                    V_Seg=8,
+                    Location=location,
+                    Diameter=1.0,
+                    Parent=empty_parent
+                )
+                obj_bulb.color = rgb_random_color() + (1.0,)
+                obj_bulb['energy'] = 0.0  # mean no note velocity at this time
+                self.note_object[x] = obj_bulb
+                if x in loudest:
+                    self.note_light[x] = add_VBO_light(
+                        collect=col_obj,
+                        name=col_obj.name + "_Light_" + str(x),
+                        location=location,
+                        parent=empty_parent)
+                    self.note_light[x].data.color = obj_bulb.color[:3]
+            else:
+                self.note_object[x] = add_VBO_light(
+                    collect=col_obj,
+                    name=col_obj.name + "_Light_" + str(x),
+                    location=location,
+                    parent=empty_parent)
+            # Instance of the lampshade
+            obj_inst = add_empty(col_obj, col_obj.name + "_Lampshade_" + str(x), location)
+            obj_inst.parent = empty_parent
+            obj_inst.instance_type = 'COLLECTION'
+            obj_inst.instance_collection = col_lampshade
         current_place += 1
 
     self.note_object[128] = obj_model_part
@@ -642,6 +1562,7 @@ def Channel_is_LT(self, col_obj, empty_parent):
 def LT_note_evt(self, obj, frame, note, velocity):
     """ LT = Light
     Change energy of light/note accordingly to velocity
+    With backend EMISSION, change the energy property read by the bulb material
     IN
         frame       int     Index of frame
         note        int     note number (0-127)
@@ -652,8 +1573,17 @@ def LT_note_evt(self, obj, frame, note, velocity):
     if velocity != self.last_note_status[note]:
         LT_note_evt(self, obj, frame - self.curve, note, self.last_note_status[note])
     energy = velocity * 1000
-    obj.data.energy = energy
-    obj.data.keyframe_insert(data_path='energy', frame=frame)
+    if self.backend == "EMISSION":
+        # Bulb read his energy with the shared material, or directly the atlas
+        if self.atlas != "True":
+            obj['energy'] = velocity / 127
+            obj.keyframe_insert(data_path="""["energy"]""", frame=frame)
+        if note in self.note_light:
+            self.note_light[note].data.energy = energy
+            self.note_light[note].data.keyframe_insert(data_path='energy', frame=frame)
+    else:
+        obj.data.energy = energy
+        obj.data.keyframe_insert(data_path='energy', frame=frame)
     self.last_note_status[note] = velocity
     return None
 
@@ -663,7 +1593,7 @@ def Channel_is_FT(self, col_obj, empty_parent, material):
     Instanciate with a channel typed : FT - Fountain
     """
     # Create small UV sphere to become the particle object
-    add_VBO(
+    obj_particle = add_VBO(
         Type="UVSphere",
         Col=col_obj,
         Name=col_obj.name + "_particle",
@@ -686,6 +1616,11 @@ def Channel_is_FT(self, col_obj, empty_parent, material):
         Parent=empty_parent
     )
 
+    # Plan all bursts of the channel up front, the end of each burst is known at his note_on
+    # so his PS is created once with static settings, nothing is keyed
+    intervals = note_intervals(self.events)
+    lifetime = max(1, int(framerate * 20 * ft_lifetime_scale))  # *4
+
     current_place = 0
     median_place = self.count_place // 2
     # Duplicate template, one by note
@@ -697,6 +1632,12 @@ def Channel_is_FT(self, col_obj, empty_parent, material):
                 name=fountain_name,
                 location=((current_place - median_place) * self.cf, 0, 0),
                 model=obj_model)
+
+            # Many bursts of a note can start on the same frame
+            self.pool_plan[x] = {}
+            for note, frame_on, frame_off, vel in intervals:
+                if note == x:
+                    self.pool_plan[x].setdefault(frame_on, []).append([obj_particle, frame_off, lifetime])
         current_place += 1
 
     self.note_object[128] = obj_model
@@ -704,11 +1645,50 @@ def Channel_is_FT(self, col_obj, empty_parent, material):
     return None
 
 
+def FT_add_ps(obj, obj_particle, count, frame_start, frame_end, lifetime, align):
+    """ Add the particle system of one burst to a fountain emitter
+    Settings of particles can't be animated and a change of them restart the simulation,
+    so each burst has his own PS with static settings
+    IN
+        obj             obj     fountain emitter
+        obj_particle    obj     object instanciated by particles
+        count           int     count of particles
+        frame_start     float   first frame of emission
+        frame_end       float   last frame of emission
+        lifetime        int     lifetime of particles
+        align           float   velocity along Z axis
+    OUT
+        The particle system created
+    """
+    # add particle system to the ico sphere emitter
+    obj.modifiers.new(name='particles', type='PARTICLE_SYSTEM')
+    ps = obj.particle_systems
+    name_of_ps = obj.name + "_PS_" + str(len(ps))
+    ps.active.name = name_of_ps
+
+    settings = ps.active.settings
+    settings.name = name_of_ps
+    settings.render_type = 'OBJECT'
+    settings.instance_object = obj_particle
+    settings.count = count
+    # Be sure to initialize frame_end before frame_start because
+    # frame_start can't be greather than frame_end at any time
+    settings.frame_end = frame_end
+    settings.frame_start = frame_start
+    settings.lifetime = lifetime
+    settings.emit_from = 'FACE'
+    settings.distribution = 'JIT'
+    settings.userjit = 10
+    settings.object_align_factor[2] = align
+
+    return ps.active
+
+
 def FT_note_evt(self, obj, frame, note, velocity):
     """ FT = Fountain
     Activate emitter of fountain accordingly to velocity
     Using 1 new PS (Particles System) with frame_start/frame_end and not keyframed
-    Self.last_note_status contain the last current PS in progress
+    Self.pool_plan contain the end of the bursts by note_on frame
     IN
         frame       int     Index of frame
         note        int     note number (0-127)
@@ -716,43 +1696,11 @@ def FT_note_evt(self, obj, frame, note, velocity):
     OUT
         None
     """
-    # Create new PS with set of frame_start
+    # Create the PS of the burst, note_off is already known by the planning
     if velocity != 0:
-
-        current_ps = self.last_note_status[note] + 1
-
-        # add particle system to the ico sphere emitter
-        ps = obj.modifiers.new(name='particles', type='PARTICLE_SYSTEM')
-        ps = obj.particle_systems
-        name_of_ps = obj.name + "_PS_" + str(current_ps)
-        ps.active.name = name_of_ps
-
-        # Set all usefull parameters to emitter
-        obj_particle_name = 'FT_' + str(self.idx) + "_particle"
-        obj_particle = b_dat.objects[obj_particle_name]
-        ps.active.settings.name = name_of_ps
-        ps.active.settings.render_type = 'OBJECT'
-        ps.active.settings.instance_object = obj_particle
-        ps.active.settings.count = velocity * 2
-
-        # Be sure to initialize frame_end before frame_start because
-        # frame_start can't be greather than frame_end at any time
-        ps.active.settings.frame_end = frame
-        ps.active.settings.frame_start = frame
-        ps.active.settings.lifetime = framerate * 20  # *4
-        ps.active.settings.emit_from = 'FACE'
-        ps.active.settings.distribution = 'JIT'
-        ps.active.settings.userjit = 10
-        ps.active.settings.object_align_factor[2] = velocity // 8
-
-        self.last_note_status[note] = current_ps
-
-    # set frame_end of existing current PS
-    else:
-        current_ps = self.last_note_status[note]
-        ps_name = obj.name + "_PS_" + str(current_ps)
-        ps = b_dat.particles[ps_name]
-        ps.frame_end = frame
+        obj_particle, frame_off, lifetime = self.pool_plan[note][frame].pop(0)
+        count = max(1, int(velocity * 2 * ft_count_scale))
+        FT_add_ps(obj, obj_particle, count, frame, frame_off, lifetime, velocity // 8)
 
     return None
 
@@ -798,53 +1746,193 @@ def Channel_is_FS(self, col_obj, empty_parent, material):
         model=obj_model
     )
 
-    mat_black = Create_material_simple(col_name + "_mat_black", 0.0, 0.0, 0.0, False)
-    mat_white = Create_material_simple(col_name + "_mat_white", 1.0, 1.0, 1.0, False)
+    mat_black = Create_material_simple(col_name + "_mat_black", 0.0, 0.0, 0.0, False)
+    mat_white = Create_material_simple(col_name + "_mat_white", 1.0, 1.0, 1.0, False)
+
+    # One target by used note, all merged into one object
+    obj_targets = add_VBO_targets(
+        collect=col_obj,
+        name=col_obj.name + "_Targets",
+        parent=empty_parent,
+        list_note=self.list_note,
+        mat_white=mat_white,
+        mat_black=mat_black
+    )
+    if self.backend != "ANALYTIC":
+        obj_targets.modifiers.new(name="Collision", type='COLLISION')
+
+    self.note_object[128] = obj_model
+
+    # Balls are keyed along their parabola, no particle at all
+    if self.backend == "ANALYTIC":
+        FS_plan_flights(self, col_obj, empty_parent, material)
+
+    # initialize note status fo FS
+    for note in self.list_note:
+        self.last_note_status_FS[note] = 0
+
+    return None
+
+
+def add_VBO_targets(collect, name, parent, list_note, mat_white, mat_black):
+    """ Create the targets of FS, only for used notes, merged into one mesh
+    One vertex group and one shape key (target pressed) by note
+    Targets are placed on a ring by octave and on an angle by note
+    IN
+        collect         obj     collection
+        name            str     name of created object
+        parent          obj     empty parent
+        list_note       list    list of used notes
+        mat_white       obj     material for natural notes
+        mat_black       obj     material for sharp notes
+    OUT
+        The object targets created
+    """
+    theta = math.radians(360)  # 2 Pi, just one circle
+    alpha = theta / 12  # 12 is the Number of notes per octave
+
+    bm = bmesh.new()
+    targets = []  # [note, verts of plane, matrix to press plane]
+    for note in list_note:
+        o = midinote_to_octave[note]
+        n = midinote_to_note_num[note]
+        angle = (12 - n) * alpha
+        distance = (o * 1.25) + 4
+        x = (distance * math.cos(angle))
+        y = (distance * math.sin(angle))
+        rot = mathutils.Matrix.Rotation(angle, 4, 'Z')
+        mat_loc = mathutils.Matrix.Translation((x, y, 0.0))
+        mat_scale = mathutils.Matrix.Diagonal((0.3, 0.4 + (o/6), 1.0, 1.0))
+        verts = bmesh.ops.create_grid(
+            bm, x_segments=1, y_segments=1, size=2.0, matrix=mat_loc @ rot @ mat_scale)['verts']
+        for face in verts[0].link_faces:
+            face.material_index = int(len(octave[n]) == 2)
+        # Pressed target is shorter, same as scale y from 0.4 to 0.2
+        mat_press = mathutils.Matrix.Diagonal((1.0, (0.2 + (o/6)) / (0.4 + (o/6)), 1.0, 1.0))
+        targets.append([note, verts, mat_loc @ rot @ mat_press @ rot.inverted() @ mat_loc.inverted()])
+
+    mesh = b_dat.meshes.new(name)
+    bm.verts.index_update()
+    targets = [[note, [v.index for v in verts], mat] for note, verts, mat in targets]
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = b_dat.objects.new(name, mesh)
+    b_con.scene.collection.objects.link(obj)
+    obj.parent = parent
+    obj.data.materials.append(mat_white)
+    obj.data.materials.append(mat_black)
+
+    obj.shape_key_add(name="Basis", from_mix=False)
+    for note, verts, mat in targets:
+        target_name = collect.name + '_Target_' + str(midinote_to_octave[note]) + '_' + str(midinote_to_note_num[note])
+        group = obj.vertex_groups.new(name=target_name)
+        group.add(verts, 1.0, 'ADD')
+        sk = obj.shape_key_add(name=target_name, from_mix=False)
+        for v in verts:
+            sk.data[v].co = mat @ mesh.vertices[v].co
+
+    assign_to_collection(collect, obj)
 
-    theta = math.radians(360)  # 2 Pi, just one circle
-    alpha = theta / 12  # 12 is the Number of notes per octave
+    return obj
 
-    # 11 octaves
-    for o in range(11):
-        # Create 12 notes targets (0-11)
-        for n in range(12):
-            plane_name = col_obj.name + "_Target_" + str(o) + "_" + str(n)
-            angle = (12 - n) * alpha
-            distance = (o * 1.25) + 4
-            x = (distance * math.cos(angle))
-            y = (distance * math.sin(angle))
-            rot = math.radians(math.degrees(angle))
-            if len(octave[n]) == 2:
-                obj_plane = add_VBO(
-                    Type="Plane",
-                    Col=col_obj,
-                    Name=plane_name,
-                    Mat=mat_black,
-                    Size=2.0,
-                    Location=(x, y, 0.0),
-                    Scale=(0.3, 0.4 + (o/6), 1),
-                    Rotate=(0, 0, rot),
-                    Parent=empty_parent
-                )
-            else:
-                obj_plane = add_VBO(
-                    Type="Plane",
-                    Col=col_obj,
-                    Name=plane_name,
-                    Mat=mat_white,
-                    Size=2.0,
-                    Location=(x, y, 0.0),
-                    Scale=(0.3, 0.4 + (o/6), 1),
-                    Rotate=(0, 0, rot),
-                    Parent=empty_parent
-                )
-            obj_plane.modifiers.new(name="Collision", type='COLLISION')
 
-    self.note_object[128] = obj_model
+def FS_plan_flights(self, col_obj, empty_parent, material):
+    """
+    Compute the flight of all balls of FS in closed form and key them
+    Each note_on launch a ball from emitter landing on his target exactly at note frame
+    The parabola is exact with 2 bezier keyframes by flight and by axis :
+    handles at 1/3 of flight time carry the velocities of launch and impact
+    Balls are pooled, a ball is busy from his launch until a short hold on target
+    """
+    shots = np.array([[frame, note] for frame, note, velocity in self.events if velocity != 0], dtype=np.float64)
+    if len(shots) == 0:
+        return None
 
-    # initialize note status fo FS
-    for note in self.list_note:
-        self.last_note_status_FS[note] = 0
+    # Time in frames, gravity in blender unit per frame²
+    flight = self.flight_time * framerate
+    hold = framerate // 2
+    gravity = np.array(b_scn.gravity) * b_scn.use_gravity / (framerate * framerate)
+
+    # Place of emitter and targets, same math as targets creation
+    alpha = math.radians(360) / 12  # 12 is the Number of notes per octave
+    notes = shots[:, 1].astype(int)
+    angle = (12 - (notes % 12)) * alpha
+    distance = ((notes // 12) * 1.25) + 4
+    radius = 0.2
+    pos_launch = np.broadcast_to(np.array(self.note_object[0].location), (len(shots), 3))
+    pos_impact = np.stack([distance * np.cos(angle), distance * np.sin(angle), np.full(len(shots), radius)], axis=1)
+
+    # Velocities at launch and at impact
+    vel_launch = (pos_impact - pos_launch - 0.5 * gravity * flight * flight) / flight
+    vel_impact = vel_launch + gravity * flight
+
+    frame_impact = shots[:, 0]
+    frame_launch = frame_impact - flight
+    third = flight / 3
+
+    # Pool of balls
+    windows = np.stack([frame_launch, frame_impact + hold], axis=1).tolist()
+    slots, size = pool_schedule(windows)
+    slots = np.array(slots)
+
+    # Create template and balls
+    obj_model = add_VBO(
+        Type="UVSphere",
+        Col=col_obj,
+        Name=col_obj.name + "_ball",
+        Mat=material,
+        U_Seg=8,
+        V_Seg=8,
+        Location=(-50 * self.cf, 0, -20),
+        Diameter=radius * 2,
+        Parent=empty_parent
+    )
+    for slot in range(size):
+        obj_ball = duplicate_linked(
+            collect=col_obj,
+            name=col_obj.name + "_ball_" + str(slot),
+            location=(0, 0, 0),
+            model=obj_model
+        )
+        flights = np.nonzero(slots == slot)[0]
+        count = len(flights)
+
+        # 2 keyframes by flight : launch (bezier) then impact (constant until next launch)
+        frames = np.empty(count * 2)
+        frames[0::2] = frame_launch[flights]
+        frames[1::2] = frame_impact[flights]
+        interpolation = ['BEZIER', 'CONSTANT'] * count
+        for axis in range(3):
+            values = np.empty(count * 2)
+            values[0::2] = pos_launch[flights, axis]
+            values[1::2] = pos_impact[flights, axis]
+            # Handles following the tangent of parabola
+            slope = np.empty(count * 2)
+            slope[0::2] = vel_launch[flights, axis]
+            slope[1::2] = vel_impact[flights, axis]
+            keyframes_bulk(
+                obj_ball, 'location', axis,
+                co=np.stack([frames, values], axis=1),
+                interpolation=interpolation,
+                handle_left=np.stack([frames - third, values - slope * third], axis=1),
+                handle_right=np.stack([frames + third, values + slope * third], axis=1)
+            )
+
+        # Visible only during flight and the hold on target
+        frames = np.empty(count * 2 + 1)
+        frames[0] = frame_launch[flights[0]] - 1
+        frames[1::2] = frame_launch[flights]
+        frames[2::2] = frame_impact[flights] + hold
+        hidden = np.empty(count * 2 + 1)
+        hidden[0::2] = 1
+        hidden[1::2] = 0
+        for data_path in ('hide_viewport', 'hide_render'):
+            keyframes_bulk(
+                obj_ball, data_path, 0,
+                co=np.stack([frames, hidden], axis=1),
+                interpolation=['CONSTANT'] * len(frames)
+            )
 
     return None
 
@@ -862,19 +1950,14 @@ def FS_animate_target(self, obj, frame, note, velocity):
     if velocity != self.last_note_status_FS[note]:
         FS_animate_target(self, obj, frame - self.curve, note, self.last_note_status_FS[note])
 
-    # Find target
+    # Find target, his shape key press it
     octave = str(midinote_to_octave[note])
     num_note = str(midinote_to_note_num[note])
     target_name = 'FS_' + str(self.idx) + '_Target_' + octave + '_' + num_note
-    obj = b_dat.objects[target_name]
-    if velocity != 0:
-        scale_y = 0.2 + (midinote_to_octave[note] / 6)
-    else:
-        scale_y = 0.4 + (midinote_to_octave[note] / 6)
-    obj.scale = obj.scale.x, scale_y, obj.scale.z
-    obj.keyframe_insert(data_path='scale', frame=frame)
-    obj['velocity'] = velocity
-    obj.keyframe_insert(data_path="""["velocity"]""", frame=frame)
+    obj = b_dat.objects['FS_' + str(self.idx) + '_Targets']
+    sk = obj.data.shape_keys.key_blocks[target_name]
+    sk.value = float(velocity != 0)
+    sk.keyframe_insert(data_path='value', frame=frame)
     self.last_note_status_FS[note] = velocity
     return None
 
@@ -896,7 +1979,8 @@ def FS_note_evt(self, obj, frame, note, velocity):
 
     # Create new PS with set of frame_start
     # This vizualisation react only to note_on
-    if velocity != 0:
+    # With backend ANALYTIC balls are already keyed by FS_plan_flights
+    if velocity != 0 and self.backend != "ANALYTIC":
 
         # empirical values of the coefficient applied to z velocity following the octave
         coef_z = {
@@ -1013,8 +2097,6 @@ def Channel_is_SW(self, col_obj, empty_parent, material):
         Parent=empty_parent
     )
 
-    self.last_note_status[0] = 0  # become a counter of balls created later
-
     # Creating 12 materials for futures balls.
     Create_material_simple(col_obj.name + "_mat_0",  0.0, 0.0, 1.0, False)  # C  => Blue
     Create_material_simple(col_obj.name + "_mat_1",  0.0, 0.0, 0.0, True)   # C# => Random
@@ -1053,13 +2135,214 @@ def Channel_is_SW(self, col_obj, empty_parent, material):
         #     Parent=empty_parent
         # )
 
+    # Plan flights of all balls, a ball is busy from the shot to the end of his flight
+    shots = {}
+    for frame, note, velocity in self.events:
+        if velocity != 0:
+            shots.setdefault(midinote_to_note_num[note], []).append([note, frame])
+
+    # One pool of balls by pitch class, so a ball never change his material and splash
+    # Each flight add to his ball a PS with static settings, his splash live after the flight
+    # With backend BAKED, the splash is simulated once by pitch class and instanced by a second pool
+    gun_name = self.note_object[0].name
+    splash = self.backend != "BAKED"
+    for n, shots_n in shots.items():
+        windows = [[frame - self.delay, frame + framerate] for note, frame in shots_n]
+        slots, size = pool_schedule(windows)
+        balls = [SW_add_ball(col_obj, empty_parent, gun_name, n, slot, splash) for slot in range(size)]
+        flights = []
+        for (note, frame), slot in zip(shots_n, slots):
+            flights.append([balls[slot], None])
+            self.pool_plan.setdefault(note, {}).setdefault(frame, []).append(flights[-1])
+
+        if not splash:
+            filepath = SW_bake_splash(col_obj, empty_parent, gun_name, n, self.splash_len)
+            windows = [[frame, frame + self.splash_len] for note, frame in shots_n]
+            slots, size = pool_schedule(windows)
+            splashes = [SW_add_splash(col_obj, gun_name, n, slot, filepath) for slot in range(size)]
+            for flight, slot in zip(flights, slots):
+                flight[1] = splashes[slot]
+
+    # The gun is the controller of channel
+    self.note_object[128] = self.note_object[0]
+
     return None
 
 
+def SW_add_ball(collect, parent, gun_name, num_note, slot, splash):
+    """ Create one ball of the pool of a pitch class
+    The ball is hidden, only his flights are keyframed later
+    IN
+        collect     obj     collection
+        parent      obj     empty parent
+        gun_name    str     name of the gun, prefix of materials and particles
+        num_note    int     pitch class of the pool (0-11)
+        slot        int     index of the ball into the pool
+        splash      bool    True if the ball carry his own splash particles
+    OUT
+        The object ball created
+    """
+    # Material color used by this pitch class
+    material = b_dat.materials[gun_name + "_mat_" + str(num_note)]
+
+    ball_name = gun_name + "_ball_" + str(num_note) + "_" + str(slot)
+    ball_obj = add_VBO(
+        Type="UVSphere",
+        Col=collect,
+        Name=ball_name,
+        Mat=material,
+        U_Seg=16,
+        V_Seg=16,
+        Diameter=1.0,
+        Parent=parent
+    )
+    # Hide the ball but not his splash, a ball without splash is fully hidden
+    ball_obj.show_instancer_for_viewport = False
+    ball_obj.show_instancer_for_render = False
+    ball_obj.hide_viewport = not splash
+    ball_obj.hide_render = not splash
+
+    # add modifier strech for flatten on impact
+    mod = ball_obj.modifiers.new(name="flatten", type='SIMPLE_DEFORM')
+    mod.deform_method = 'STRETCH'
+    mod.deform_axis = 'Y'
+    mod.factor = 0
+
+    return ball_obj
+
+
+def SW_add_splash_ps(ball_obj, gun_name, num_note, frame_start, frame_end, lifetime):
+    """ Add to a ball the particle system of one splash
+    Settings of particles can't be animated and a change of them restart the simulation,
+    so each splash has his own PS with static settings
+    IN
+        ball_obj    obj     ball, emitter of splash
+        gun_name    str     name of the gun, prefix of materials and particles
+        num_note    int     pitch class of the ball (0-11)
+        frame_start float   first frame of emission
+        frame_end   float   last frame of emission
+        lifetime    int     lifetime of particles
+    OUT
+        The particle system created
+    """
+    ball_obj.modifiers.new(name='particles', type='PARTICLE_SYSTEM')
+    ps = ball_obj.particle_systems
+    name_of_ps = ball_obj.name + "_SW_" + str(len(ps))
+    ps.active.name = name_of_ps
+    part_name = gun_name + "_particle_" + str(num_note)
+    obj_particle = b_dat.objects[part_name]
+
+    settings = ps.active.settings
+    settings.physics_type = 'FLUID'
+    settings.name = name_of_ps
+    settings.render_type = 'OBJECT'
+    settings.instance_object = obj_particle
+    settings.count = 500
+    settings.particle_size = 0.25
+    # Be sure to initialize frame_end before frame_start because
+    # frame_start can't be greather than frame_end at any time
+    settings.frame_end = frame_end
+    settings.frame_start = frame_start
+    settings.lifetime = lifetime
+    settings.emit_from = 'VERT'
+    settings.use_emit_random = True
+    settings.fluid.linear_viscosity = 1
+    settings.damping = 0.2
+
+    return ps.active
+
+
+def SW_bake_splash(collect, parent, gun_name, num_note, splash_len):
+    """ Simulate once the splash of a pitch class and bake it to a mesh sequence
+    A reference ball splash on the center of wall, the metaball of pitch class
+    polygonise his particles and is exported to an alembic file
+    IN
+        collect     obj     collection
+        parent      obj     empty parent
+        gun_name    str     name of the gun, prefix of materials and particles
+        num_note    int     pitch class (0-11)
+        splash_len  int     count of frames of splash
+    OUT
+        str     filepath of the alembic file
+    """
+    # The file is named by the fingerprint of the simulation, an existing one is reused
+    os.makedirs(pathcache, exist_ok=True)
+    fingerprint = channel_fingerprint({}, [], [num_note], [mtb_version, framerate, splash_len])
+    filepath = os.path.join(pathcache, gun_name + "_splash_" + str(num_note) + "_" + fingerprint + ".abc")
+    if os.path.isfile(filepath):
+        return filepath
+
+    # Reference ball, static on the wall, splash at start of timeline
+    ball_ref = SW_add_ball(collect, parent, gun_name, num_note, "ref", True)
+    ball_ref.location = (0.0, 40.0, 0.0)
+    settings = SW_add_splash_ps(ball_ref, gun_name, num_note, 1, 11, splash_len).settings
+
+    # Export only the metaball, his polygonisation contain all particles
+    obj_mball = b_dat.objects[gun_name + "_particle_" + str(num_note)]
+    for obj in b_con.view_layer.objects:
+        obj.select_set(False)
+    obj_mball.select_set(True)
+    b_con.view_layer.objects.active = obj_mball
+    frame_current = b_scn.frame_current
+    b_ops.wm.alembic_export(filepath=filepath, start=1, end=1 + splash_len, selected=True, flatten=True)
+    b_scn.frame_set(frame_current)
+
+    # Remove the reference ball and his datablocks, nothing else use them
+    mesh = ball_ref.data
+    b_dat.objects.remove(ball_ref, do_unlink=True)
+    b_dat.meshes.remove(mesh)
+    b_dat.particles.remove(settings)
+
+    return filepath
+
+
+def SW_add_splash(collect, gun_name, num_note, slot, filepath):
+    """ Create one splash of the pool of a pitch class
+    The splash read the baked mesh sequence, his time is keyed by impacts
+    IN
+        collect     obj     collection
+        gun_name    str     name of the gun, prefix of materials and particles
+        num_note    int     pitch class of the pool (0-11)
+        slot        int     index of the splash into the pool
+        filepath    str     alembic file of the splash baked
+    OUT
+        The object splash created
+    """
+    # Same place than the metaball exported, the impact is added later
+    obj_mball = b_dat.objects[gun_name + "_particle_" + str(num_note)]
+    material = b_dat.materials[gun_name + "_mat_" + str(num_note)]
+
+    splash_name = gun_name + "_splash_" + str(num_note) + "_" + str(slot)
+    mesh = b_dat.meshes.new(splash_name)
+    mesh.materials.append(material)
+    obj = b_dat.objects.new(splash_name, mesh)
+    b_con.scene.collection.objects.link(obj)
+    obj.parent = obj_mball.parent
+    obj.rotation_euler = obj_mball.rotation_euler
+    obj.scale = obj_mball.scale
+    obj.hide_viewport = True
+    obj.hide_render = True
+
+    # Each splash have his own cache file, to key his own time
+    cache_file = b_dat.cache_files.load(filepath)
+    cache_file.name = splash_name
+    cache_file.override_frame = True
+    mod = obj.modifiers.new(name="splash", type='MESH_SEQUENCE_CACHE')
+    mod.cache_file = cache_file
+    paths = [p.path for p in cache_file.object_paths if p.path.endswith("/" + obj_mball.data.name)]
+    if paths:
+        mod.object_path = paths[0]
+
+    assign_to_collection(collect, obj)
+
+    return obj
+
+
 def SW_note_evt(self, obj, frame, note, velocity):
     """ SW = Splash Wall
     Splash note_on figured by balls on the wall.
     Ball color follow the note and location on the impact follow octave
+    Balls come from pools by pitch class, each flight is keyed on a free ball
     IN
         frame       int     Index of frame
         note        int     note number (0-127)
@@ -1067,29 +2350,25 @@ def SW_note_evt(self, obj, frame, note, velocity):
     OUT
         None
     """
-    # Create new ball with all animation stuff
+    # Key a new flight on the ball planned for this shot
     if velocity != 0:
 
-        # Material color used by this note
-        mat_name = obj.name + "_mat_" + str(midinote_to_note_num[note])
-        material = b_dat.materials[mat_name]
-
-        self.last_note_status[0] += 1
-        current_ball = self.last_note_status[0]
-
-        # create ball
-        obj_col = find_collection(b_con, obj)
-        ball_name = obj.name + "_ball_" + str(current_ball)
-        ball_obj = add_VBO(
-            Type="UVSphere",
-            Col=obj_col,
-            Name=ball_name,
-            Mat=material,
-            U_Seg=16,
-            V_Seg=16,
-            Diameter=1.0,
-            Parent=obj.parent
-        )
+        ball_obj, splash_obj = self.pool_plan[note][frame].pop(0)
+        delay = self.delay
+
+        # Show the ball only during his flight
+        # A ball without particles is hidden as object, else only as instancer to keep his splash
+        for visible, frame_visible in ((False, frame - delay - 1), (True, frame - delay), (False, frame + framerate)):
+            if splash_obj:
+                ball_obj.hide_viewport = not visible
+                ball_obj.keyframe_insert(data_path='hide_viewport', frame=frame_visible)
+                ball_obj.hide_render = not visible
+                ball_obj.keyframe_insert(data_path='hide_render', frame=frame_visible)
+            else:
+                ball_obj.show_instancer_for_viewport = visible
+                ball_obj.keyframe_insert(data_path='show_instancer_for_viewport', frame=frame_visible)
+                ball_obj.show_instancer_for_render = visible
+                ball_obj.keyframe_insert(data_path='show_instancer_for_render', frame=frame_visible)
 
 #                ball_obj.data.shade_smooth()
         # Fix his start and end positions to animate movement
@@ -1098,7 +2377,6 @@ def SW_note_evt(self, obj, frame, note, velocity):
         z = 12 - (midinote_to_octave[note] * 2)
         pos_impact = mathutils.Vector((x, 40.0, z))
         pos_end = mathutils.Vector((x, 45.0, z))
-        delay = 50  # to be evaluated following framerate and distance between gun and wall
         ball_obj.location = pos_start
         ball_obj.keyframe_insert(data_path='location', frame=frame - delay)
         ball_obj.location = pos_impact
@@ -1106,56 +2384,60 @@ def SW_note_evt(self, obj, frame, note, velocity):
         ball_obj.location = pos_end
         ball_obj.keyframe_insert(data_path='location', frame=frame + framerate)
 
-        # add modifier strech for flatten on impact
-        mod = ball_obj.modifiers.new(name="flatten", type='SIMPLE_DEFORM')
-        mod.deform_method = 'STRETCH'
-        mod.deform_axis = 'Y'
+        # flatten on impact, the ball is round again for each flight
+        mod = ball_obj.modifiers["flatten"]
         mod.factor = 0
+        mod.keyframe_insert(data_path='factor', frame=frame - delay)
         mod.keyframe_insert(data_path='factor', frame=frame - 3)
         mod.factor = -1
         mod.keyframe_insert(data_path='factor', frame=frame)
 
-        # add metaball for particles system  # For testing one mball for one PS
-        # part_name = ball_name + "_particle"
-        # add_VBO_mball(
-        #     collect=obj_col,
-        #     name=part_name,
-        #     material=material,
-        #     location=(-50, 0, 0),
-        #     parent=obj.parent
-        # )
-
-        # add particle system to create splash and animate him
-        ps = ball_obj.modifiers.new(name='particles', type='PARTICLE_SYSTEM')
-        ps = ball_obj.particle_systems
-        name_of_ps = obj.name + "_SW_" + str(current_ball)
-        ps.active.name = name_of_ps
-        # obj_particle_name = obj.name + "_particle_" + str(midinote_to_note_num[note])
-        # obj_particle = b_dat.objects[obj_particle_name]
-        part_name = obj.name + "_particle_" + str(midinote_to_note_num[note])
-        obj_particle = b_dat.objects[part_name]
-        ps.active.settings.physics_type = 'FLUID'
-        ps.active.settings.name = name_of_ps
-        ps.active.settings.render_type = 'OBJECT'
-        ps.active.settings.instance_object = obj_particle
-        ps.active.settings.count = 500
-        ps.active.settings.particle_size = 0.25
-
-        # Be sure to initialize frame_end before frame_start because
-        # frame_start can't be greather than frame_end at any time
-        ps.active.settings.frame_end = frame + 5
-        ps.active.settings.frame_start = frame - 5
-        ps.active.settings.lifetime = framerate * 20
-        ps.active.settings.emit_from = 'VERT'
-        ps.active.settings.use_emit_random = True
-        ps.active.settings.fluid.linear_viscosity = 1
-        ps.active.settings.damping = 0.2
+        if splash_obj:
+            # The splash was baked on the center of wall by the metaball of the pitch class
+            obj_mball = b_dat.objects[obj.name + "_particle_" + str(midinote_to_note_num[note])]
+            SW_splash_evt(self, splash_obj, frame, obj_mball.location + mathutils.Vector((x, 0.0, z)))
+        else:
+            # Splash of this flight, by his own PS
+            SW_add_splash_ps(ball_obj, obj.name, midinote_to_note_num[note], frame - 5, frame + 5, framerate * 20)
     else:
         pass
 
     return None
 
 
+def SW_splash_evt(self, splash_obj, frame, location):
+    """
+    Play the baked splash on the impact of one ball
+    IN
+        splash_obj  obj     splash of the pool
+        frame       int     Index of frame of impact
+        location    vector  location of splash to be on the impact
+    OUT
+        None
+    """
+    # Visible only during the splash
+    for hidden, frame_hidden in ((True, frame - 1), (False, frame), (True, frame + self.splash_len)):
+        splash_obj.hide_viewport = hidden
+        splash_obj.keyframe_insert(data_path='hide_viewport', frame=frame_hidden)
+        splash_obj.hide_render = hidden
+        splash_obj.keyframe_insert(data_path='hide_render', frame=frame_hidden)
+
+    # Move the splash to the impact
+    splash_obj.location = location
+    splash_obj.keyframe_insert(data_path='location', frame=frame)
+    set_interpolation(splash_obj)
+
+    # Time offset of the splash, frame 1 of cache at the impact
+    cache_file = splash_obj.modifiers["splash"].cache_file
+    cache_file.frame = 1
+    cache_file.keyframe_insert(data_path='frame', frame=frame)
+    cache_file.frame = 1 + self.splash_len
+    cache_file.keyframe_insert(data_path='frame', frame=frame + self.splash_len)
+    set_interpolation(cache_file, 'LINEAR')
+
+    return None
+
+
 def Channel_is_PB(self, col_obj, empty_parent, material):
     """
     Instanciate with a channel typed : PB - Paper Ball
@@ -1226,17 +2508,86 @@ def Channel_is_TP(self, col_obj, empty_parent, material):
 
     width = 200
     height = 200
+    decay = 0.9  # paint fade at each frame
 
-    # Create an image texture
+    # Create an image texture, it become the image sequence painted
     image_object = b_dat.images.new(name=col_obj.name, width=width, height=height)
-    # num_pixels = len(image_object.pixels)
+    image_object.file_format = 'PNG'
+
+    # Notes sounding at each frame are read from the interval index, frame 0 is never painted
+    count_frames = int(max([evt[0] for evt in self.events], default=0)) + framerate + 1
+    note_index = Interval_Class(note_intervals(self.events))
+
+    # One stroke by note : a disk in the cell (note, octave) with a color by note
+    colors = np.array([rgb_random_color() + (1.0,) for n in range(12)], dtype=np.float32)
+    cell_x = width / 12
+    cell_y = height / 11
+    grid_y, grid_x = np.mgrid[0:height, 0:width]
+    strokes = {}
+    for note in self.list_note:
+        center_x = (midinote_to_note_num[note] + 0.5) * cell_x
+        center_y = (midinote_to_octave[note] + 0.5) * cell_y
+        distance = (grid_x - center_x) ** 2 + (grid_y - center_y) ** 2
+        strokes[note] = (distance / (min(cell_x, cell_y) / 2) ** 2).astype(np.float32)
+
+    # Accumulate strokes frame by frame and write the sequence on disk
+    # An image is written only when his 8 bits pixels change, frames of each image are kept
+    os.makedirs(pathcache, exist_ok=True)
+    buffer = np.zeros((height, width, 4), dtype=np.float32)
+    buffer[:, :, 3] = 1.0
+    last_pixels = None
+    frames_written = []
+    for frame in range(1, count_frames):
+        buffer[:, :, :3] *= decay
+        for note, velocity in note_index.notes_at(frame).items():
+            # Bigger and brighter with velocity
+            level = velocity / 127
+            mask = strokes[note] <= level
+            buffer[mask] = np.maximum(buffer[mask], colors[midinote_to_note_num[note]] * level)
+        pixels = np.round(buffer * 255).astype(np.uint8)
+        if last_pixels is not None and np.array_equal(pixels, last_pixels):
+            continue
+        last_pixels = pixels
+        frames_written.append(frame)
+        image_object.pixels.foreach_set(buffer.ravel())
+        image_object.filepath_raw = os.path.join(
+            pathcache, col_obj.name + "_" + str(len(frames_written)).zfill(5) + ".png")
+        image_object.save()
+
+    # Plane show the image sequence
+    image_seq = b_dat.images.load(os.path.join(pathcache, col_obj.name + "_" + str(1).zfill(5) + ".png"))
+    image_seq.source = 'SEQUENCE'
+    nodes = material.node_tree.nodes
+    node_tex = nodes.new('ShaderNodeTexImage')
+    node_tex.image = image_seq
+    node_tex.image_user.frame_start = 1
+    node_tex.image_user.frame_duration = count_frames - 1
+    node_tex.image_user.use_auto_refresh = True
+    material.node_tree.links.new(node_tex.outputs['Color'], nodes['Principled BSDF'].inputs['Base Color'])
+
+    # Image n is shown from his frame to the frame before the next image,
+    # the offset of sequence follow linearly the frame between 2 images
+    co = []
+    for num, frame in enumerate(frames_written, 1):
+        frame_next = frames_written[num] if num < len(frames_written) else count_frames
+        co.append([frame, num - frame])
+        if frame_next - 1 > frame:
+            co.append([frame_next - 1, num - (frame_next - 1)])
+    keyframes_bulk(
+        material.node_tree, 'nodes["' + node_tex.name + '"].image_user.frame_offset', 0,
+        co=co,
+        interpolation=['LINEAR'] * len(co)
+    )
+
+    # The plane is the controller of channel
+    self.note_object[128] = self.note_object[0]
 
     return None
 
 
 def TP_note_evt(self, obj, frame, note, velocity):
     """ TP = Texture Paint
-    Place note_on with Channel object, velocity and keyframe
+    All events are already painted by Channel_is_TP into an image sequence
     IN
         frame       int     Index of frame
         note        int     note number (0-127)
@@ -1244,25 +2595,345 @@ def TP_note_evt(self, obj, frame, note, velocity):
     OUT
         None
     """
-    # To avoid pb slowly grow before the note
-    # Aplly it to objet (plane)
+    return None
+
+
+def Channel_is_PR(self, col_obj, empty_parent, material):
+    """
+    Instanciate with a channel typed : PR - Piano Roll
+    All notes of the song are falling notes of a single mesh,
+    one quad by note interval placed by pitch and time.
+    Only the parent of the roll is animated, with 2 keyframes
+    """
+    speed = 8 / framerate   # blender unit by frame
+    width = self.cf * 0.4   # half width of a note
+
+    intervals = np.array(note_intervals(self.events), dtype=np.float64).reshape(-1, 4)
+    count = len(intervals)
+    median_place = self.count_place // 2
+    x = ((intervals[:, 0] - self.min_note) - median_place) * self.cf
+    y_on = intervals[:, 1] * speed
+    y_off = np.maximum(intervals[:, 2], intervals[:, 1] + 1) * speed
+
+    # 4 vertices by note, in the order of the quad
+    verts = np.zeros((count, 4, 3), dtype=np.float32)
+    verts[:, 0, 0] = x - width
+    verts[:, 1, 0] = x + width
+    verts[:, 2, 0] = x + width
+    verts[:, 3, 0] = x - width
+    verts[:, 0, 1] = y_on
+    verts[:, 1, 1] = y_on
+    verts[:, 2, 1] = y_off
+    verts[:, 3, 1] = y_off
+
+    mesh = b_dat.meshes.new(col_obj.name)
+    mesh.vertices.add(count * 4)
+    mesh.vertices.foreach_set("co", verts.ravel())
+    mesh.loops.add(count * 4)
+    mesh.loops.foreach_set("vertex_index", np.arange(count * 4, dtype=np.int32))
+    mesh.polygons.add(count)
+    mesh.polygons.foreach_set("loop_start", np.arange(0, count * 4, 4, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_total", np.full(count, 4, dtype=np.int32))
+    mesh.update()
+    mesh.materials.append(material)
+
+    obj_roll = b_dat.objects.new(col_obj.name, mesh)
+    b_con.scene.collection.objects.link(obj_roll)
+    obj_roll.parent = empty_parent
+    assign_to_collection(col_obj, obj_roll)
+
+    # Whole song fall with only 2 keyframes, each note reach the line y = 0 at his frame
+    frame_end = max(1.0, float(intervals[:, 2].max(initial=0.0)))
+    keyframes_bulk(
+        obj_roll, 'location', 1,
+        co=[[0.0, 0.0], [frame_end, -frame_end * speed]],
+        interpolation=['LINEAR', 'LINEAR']
+    )
+
+    self.note_object[0] = obj_roll
+    self.note_object[128] = obj_roll
+
+    return None
+
+
+def Channel_use_atlas(self, col_obj):
+    """
+    Material of channel read a note atlas instead of keyframes
+    Available for BG, GD and LT with backend EMISSION
+    """
+    image, width, rows = add_note_atlas(col_obj.name + "_atlas", self.events)
+
+    # Note index on each object
+    if (self.visual_type == "BG" and self.backend != "SHAPEKEY") or self.visual_type == "LT":
+        if self.visual_type == "LT" and self.backend != "EMISSION":
+            print("Atlas need backend EMISSION for LT, channel {} ignored".format(self.idx))
+            self.atlas = "False"
+            return None
+        mat = Create_material_atlas(col_obj.name + "_mat_atlas", image, width, rows, True)
+        for x in self.list_note:
+            self.note_object[x]['note'] = x
+            assign_material(self.note_object[x], mat)
+        return None
+
+    # Note index on each face, uv map "note"
+    obj = self.note_object[128]
+    me = obj.data
+    face_note = np.full(len(me.polygons), 128, dtype=np.float32)
+    if self.visual_type == "GD":
+        for x in range(1, 127):
+            if x in self.list_note:
+                face_note[grid_face_of_note(x)] = x
+    elif self.visual_type == "BG":
+        # Bars of add_VBO_bars are in the order of list_note, 8 vertices by bar
+        notes = np.array(self.list_note, dtype=np.float32)
+        first_vertex = np.array([p.vertices[0] for p in me.polygons])
+        face_note = notes[first_vertex // 8]
+    else:
+        return None
+
+    loop_total = np.zeros(len(me.polygons), dtype=np.int32)
+    me.polygons.foreach_get("loop_total", loop_total)
+    uv = np.zeros((len(me.loops), 2), dtype=np.float32)
+    uv[:, 0] = np.repeat(face_note, loop_total)
+    me.uv_layers.new(name="note").data.foreach_set("uv", uv.ravel())
+    assign_material(obj, Create_material_atlas(col_obj.name + "_mat_atlas", image, width, rows, False))
+
+    return None
 
-    # Paint it with note_evt...
-    # x = midinote_to_note_num[note]
-    # y = midinote_to_octave[note]
-    # num = x * (y + 1)
-    # image_object.pixels[num] = 1.0                  # R
-    # image_object.pixels[num+1] = random.random()    # G
-    # image_object.pixels[num+2] = random.random()    # B
-    # image_object.pixels[num+3] = random.random()    # A
+
+def Channel_key_velocity(self):
+    """
+    Key the velocity of all notes into one array property "velocity" of note_object[128]
+    Index of array is the note number, one fcurve by used note
+    With "Drivers": "True", each object of a single note get also his own "velocity"
+    """
+    # Last velocity of each note at each frame
+    changes = {}
+    for frame, note, velocity in self.events:
+        changes.setdefault(note, {0: 0})[frame] = velocity
+
+    obj_channel = self.note_object[128]
+    obj_channel['velocity'] = [0] * 128
+    for note, keys in changes.items():
+        co = sorted(keys.items())
+        keyframes_bulk(obj_channel, '["velocity"]', note, co, ['CONSTANT'] * len(co))
+
+    if self.drivers != "True":
+        return None
+
+    # Only objects dedicated to one note, not the shared ones
+    users = {}
+    for note in changes:
+        obj = self.note_object.get(note)
+        users[obj] = users.get(obj, 0) + 1
+    for note, keys in changes.items():
+        obj = self.note_object.get(note)
+        if obj is not None and users[obj] == 1 and obj is not obj_channel:
+            obj['velocity'] = 0
+            co = sorted(keys.items())
+            keyframes_bulk(obj, '["velocity"]', 0, co, ['CONSTANT'] * len(co))
+
+    return None
+
+
+def Channel_set_runtime(self):
+    """
+    Runtime mode, no keyframe for notes
+    Store for each note his sorted list of changes, read by the handler runtime_frame_change
+    Data are kept into the scene, so they are saved with the file
+    """
+    changes = {}
+    for frame, note, velocity in self.events:
+        changes.setdefault(note, {})[frame] = velocity
+
+    notes = {}
+    for note, keys in changes.items():
+        obj = self.note_object.get(note)
+        if obj is None:
+            continue
+        frames = sorted(keys)
+        entry = {"object": obj.name, "frames": frames, "velocities": [keys[f] for f in frames]}
+        if self.visual_type in ("BG", "GD"):
+            entry["base"] = obj.location[2]
+        if note in self.note_light:
+            entry["light"] = self.note_light[note].name
+        notes[str(note)] = entry
+
+    obj_channel = self.note_object[128]
+    obj_channel['velocity'] = [0.0] * 128
+    b_scn["mtb_runtime"][self.visual_type + '_' + str(self.idx)] = {
+        "type": self.visual_type,
+        "backend": self.backend,
+        "curve": self.curve,
+        "channel": obj_channel.name,
+        "notes": notes
+    }
+
+    return None
+
+
+def Channel_remember(self):
+    """
+    Remember the build of a channel into the scene, see channel_fingerprint
+    """
+    if "mtb_fingerprint" not in b_scn:
+        b_scn["mtb_fingerprint"] = {}
+    b_scn["mtb_fingerprint"][str(self.idx)] = {"hash": self.fingerprint, "collection": self.col_name}
+    return None
+
+
+def Channel_cache_file(self):
+    """
+    Path of the .blend keeping the collection of a channel, see channel_cache
+    Named only by the fingerprint and the quality, so any channel of any project can share it
+    """
+    return os.path.join(pathchannels, self.fingerprint + "_" + quality + ".blend")
+
+
+def Channel_link_cache(self):
+    """
+    Replace the collection of a channel by the one linked from his .blend, see Channel_cache_file
+    The .blend can come from an other channel, the name of collection linked is kept
+    """
+    delete_collection(self.col_name)
+    with b_dat.libraries.load(Channel_cache_file(self), link=True) as (data_from, data_to):
+        data_to.collections = data_from.collections
+    # The collection of channel is tagged with his type, others are only used by him (LT lampshade)
+    for collection in data_to.collections:
+        if collection.get('mtb_type') == self.visual_type:
+            self.col_name = collection.name
+            if collection.name not in new_collec.children:
+                new_collec.children.link(collection)
+            break
+    return None
+
+
+def Channel_reuse(self):
+    """
+    Check if a channel can be kept without generating it
+    A channel unchanged since the last build is kept, except runtime ones which are cheap
+    to build and need their data for the handler.
+    A channel already built with the same fingerprint, by this project or an other one,
+    or completed by a previous run stopped before the end, is linked from his .blend
+    Collection of a channel which has changed of type is removed
+    OUT
+        True if the channel is kept or linked
+    """
+    previous = b_scn.get("mtb_fingerprint", {}).get(str(self.idx))
+    if previous:
+        unchanged = previous["hash"] == self.fingerprint and previous["collection"] in b_dat.collections
+        if unchanged and self.animate != "Runtime":
+            print('Channel {} unchanged: {}'.format(self.idx, self.name))
+            return True
+        if previous["collection"] != self.col_name:
+            delete_collection(previous["collection"])
+
+    resumed = checkpoint_done.get(str(self.idx), {}).get("hash") == self.fingerprint
+    if (channel_cache or resumed) and self.animate != "Runtime" and os.path.exists(Channel_cache_file(self)):
+        Channel_link_cache(self)
+        print('Channel {} linked from cache: {}'.format(self.idx, self.name))
+        self.linked = True
+        return True
+
+    return False
+
+
+def Channel_build(self, col_obj, empty_parent, material):
+    """
+    Create the objects of a channel following his type
+    """
+    # Type BG = Bargraphs
+    if self.visual_type == "BG":
+        Channel_is_BG(self, col_obj, empty_parent, material)
+    # Type GD = Grid
+    elif self.visual_type == "GD":
+        Channel_is_GD(self, col_obj, empty_parent, material)
+    # Type LT = Light
+    elif self.visual_type == "LT":
+        Channel_is_LT(self, col_obj, empty_parent)
+    # Type FT = Fountain
+    elif self.visual_type == "FT":
+        Channel_is_FT(self, col_obj, empty_parent, material)
+    # Type FS = Fountain Solo
+    elif self.visual_type == "FS":
+        Channel_is_FS(self, col_obj, empty_parent, material)
+    # Type SW = Slpash Wall
+    elif self.visual_type == "SW":
+        Channel_is_SW(self, col_obj, empty_parent, material)
+    # Type PB = Paper Ball
+    elif self.visual_type == "PB":
+        Channel_is_PB(self, col_obj, empty_parent, material)
+    # Type TP = Texture Paint
+    elif self.visual_type == "TP":
+        Channel_is_TP(self, col_obj, empty_parent, material)
+    # Type PR = Piano Roll
+    elif self.visual_type == "PR":
+        Channel_is_PR(self, col_obj, empty_parent, material)
+
+    return None
+
+
+def Channel_init_controls(self):
+    """
+    Key at frame 0 all controls animated on the controller of channel, note_object[128]
+    """
+    obj = self.note_object[128]
+    for control in ('modulation_wheel', 'pitchwheel', 'aftertouch', 'pan', 'expression', 'volume', 's_pedal'):
+        obj[control] = 0
+        obj.keyframe_insert(data_path='["' + control + '"]', frame=0)
 
     return None
 
 
+def Channel_add_events(self, messages, frames, frame_first=0):
+    """
+    Main LOOP on all events of a channel
+    Controls are keyed at the frame of the last note event, or at frame_first before any note
+    IN
+        messages    list    messages of channel, see MIDISong_Class
+        frames      list    frame of each message
+        frame_first float   first frame of build, start of the time window
+    OUT
+        last frame of a note event
+    """
+    current_frame = frame_first
+    for (msg_track, time_in_ticks_cumul, msg_type, channel, data1, data2), msg_frame in zip(messages, frames):
+
+        # Check if note_on with velocity 0 will become note_off
+        if (msg_type == 'note_on') and (data2 == 0):
+            msgtype = 'note_off'
+        else:
+            msgtype = msg_type
+
+        # If note_on or note_off event
+        if msgtype in ('note_on', 'note_off'):
+            # Frame of message following Tempo MAP
+            current_frame = msg_frame
+            velocity = data2 * (msgtype == 'note_on')  # to avoid note_off with velocity != 0
+            self.add_note_evt(msgtype, current_frame, data1, velocity)
+        # if pitchwheel event
+        elif msg_type == 'pitchwheel':
+            self.add_pitchwheel_evt(current_frame, data1)
+        elif msg_type == 'aftertouch':
+            self.add_aftertouch_evt(current_frame, data1)
+        elif msg_type == 'control_change':
+            self.add_ctrlchange_evt(current_frame, data1, data2)
+        else:
+            print(msg_type)
+
+        # here, later, how to deal with other msg type like
+        # control_change
+        #   sustain pedal (64), stop all notes (123)
+        # program_change
+        # and so on...
+
+    return current_frame
+
+
 class Channel_Class:
 
     # Channel initializations
-    def __init__(self, idx_channel, list_note, name, channel):
+    def __init__(self, idx_channel, list_note, name, channel, events):
         """
         Initialization of the Class Channel_Class
         IN
@@ -1275,14 +2946,30 @@ class Channel_Class:
         self.name = name                        # mean the name or description
         self.visual_type = channel["Type"]      # mean the type of visualization
         self.template = channel["Template"]     # template object or ""
-        self.animate = channel["Animate"]       # Animate, True or False
+        self.animate = channel["Animate"]       # Animate, True, False or Runtime
         self.locked = channel["Locked"]         # channel is locked ? True or False
+        self.backend = channel.get("Backend", "")   # alternative backend of visualization or ""
+        self.lights = channel.get("Lights", 0)      # max of real lights for LT with backend EMISSION
+        self.atlas = channel.get("Atlas", "False")  # materials read a note atlas, True or False
+        self.drivers = channel.get("Drivers", "False")  # velocity also keyed on each note object, True or False
+        self.seed = channel.get("Seed", idx_channel)    # seed of all random values of channel
         self.list_note = list_note              # list of note used in this channel
+        self.events = events                    # list of note events [frame, note, velocity] sorted
+
+        # Runtime mode only for types with a simple state by note, else keyed as usual
+        if self.animate == "Runtime" and self.visual_type not in ("BG", "GD", "LT", "PB"):
+            print("Runtime mode not available for type {}, channel {} keyed".format(self.visual_type, self.idx))
+            self.animate = "True"
+        # PR is fully animated by his 2 keyframes and runtime mode use no keyframe,
+        # controls are not keyed for them
+        self.keyed_controls = self.visual_type != "PR" and self.animate != "Runtime"
 
         # Internal use
         self.note_object = {}           # dictionnary {note:object}, used by animation
         self.last_note_status = {}      # dictionnary {note:status}, used by animation
         self.last_note_status_FS = {}   # same as last_note_status but for FS vizualisation Target
+        self.pool_plan = {}             # dictionnary {note:{frame:[[slot, ...], ...]}}, bursts planned by note_on
+        self.note_light = {}            # dictionnary {note:light}, real lights added to some notes
         self.min_note = 128             # lower note of the channel, mean the first note
         self.max_note = 0               # highest note of the channel, mean the last note
 
@@ -1290,6 +2977,13 @@ class Channel_Class:
         self.count_place = 0            # count of places used in channel (with note or not)
         self.cf = 2.5                   # localisation coef (!)
         self.curve = 1                  # mean the delta number of frame between evt change
+        self.delay = 50                 # delay of flight for SW, to be evaluated following framerate and distance
+        self.flight_time = 1.6          # time of flight in seconds for FS with backend ANALYTIC
+        self.splash_len = 1             # count of frames of a splash baked for SW with backend BAKED
+        self.col_name = ""              # name of collection of channel
+        self.fingerprint = ""           # fingerprint of build, see channel_fingerprint
+        self.built = False              # True if objects are built by this run
+        self.linked = False             # True if objects are linked from the channel cache
 
         """ ======= Main of __init__ ========================================== """
 
@@ -1303,7 +2997,20 @@ class Channel_Class:
         if self.locked == "True":
             return None
 
+        # Create cubes from only used notes
+        col_name = self.visual_type + '_' + str(self.idx)
+        self.col_name = col_name
+
+        # Channel unchanged or already built, nothing to generate
+        self.fingerprint = channel_fingerprint(
+            channel, self.events, self.list_note, [mtb_version, framerate, ft_count_scale, ft_lifetime_scale])
+        if Channel_reuse(self):
+            self.locked = "True"
+            return None
+
         print('Generate Channel {}: {}'.format(self.idx, self.name))
+        # Same seed, same colors and so on : two builds of a channel are the same
+        random.seed(self.seed)
         if not self.list_note:
             self.min_note = 0
             self.max_note = 0
@@ -1313,58 +3020,41 @@ class Channel_Class:
 
         self.count_place = (self.max_note - self.min_note) + 1
         self.curve = framerate // 8
+        self.splash_len = framerate * 4
 
-        # Create cubes from only used notes
-        col_name = self.visual_type + '_' + str(self.idx)
         # Create collection for this channel
         col_obj = create_collection(col_name, new_collec, delete=True)
+        # Everything created from here is owned by the channel, see tag_owner
+        snapshot = snapshot_datablocks()
         # Create the empty parent off all cubes
         empty_parent_name = col_name + '_Parent'
         empty_parent = add_empty(col_obj, empty_parent_name, (0, self.idx * self.cf, 0))
-        # Create Default material with random color
+        # Create Default material with random color, LT create his own materials
+        material = None
         if self.visual_type != "LT":
             material = Create_material_simple(col_name + "_mat", 0.0, 0.0, 0.0, True)
 
         # All objects are created the most centered as possible
-        # Type BG = Bargraphs
-        if self.visual_type == "BG":
-            Channel_is_BG(self, col_obj, empty_parent, material)
-        # Type GD = Grid
-        elif self.visual_type == "GD":
-            Channel_is_GD(self, col_obj, empty_parent, material)
-        # Type LT = Light
-        elif self.visual_type == "LT":
-            Channel_is_LT(self, col_obj, empty_parent)
-        # Type FT = Fountain
-        elif self.visual_type == "FT":
-            Channel_is_FT(self, col_obj, empty_parent, material)
-        # Type FS = Fountain Solo
-        elif self.visual_type == "FS":
-            Channel_is_FS(self, col_obj, empty_parent, material)
-        # Type SW = Slpash Wall
-        elif self.visual_type == "SW":
-            Channel_is_SW(self, col_obj, empty_parent, material)
-        # Type PB = Paper Ball
-        elif self.visual_type == "PB":
-            Channel_is_PB(self, col_obj, empty_parent, material)
-        # Type TP = Texture Paint
-        elif self.visual_type == "TP":
-            Channel_is_TP(self, col_obj, empty_parent, material)
-
-        self.note_object[128]['modulation_wheel'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["modulation_wheel"]""", frame=0)
-        self.note_object[128]['pitchwheel'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["pitchwheel"]""", frame=0)
-        self.note_object[128]['aftertouch'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["aftertouch"]""", frame=0)
-        self.note_object[128]['pan'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["pan"]""", frame=0)
-        self.note_object[128]['expression'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["expression"]""", frame=0)
-        self.note_object[128]['volume'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["volume"]""", frame=0)
-        self.note_object[128]['s_pedal'] = 0
-        self.note_object[128].keyframe_insert(data_path="""["s_pedal"]""", frame=0)
+        Channel_build(self, col_obj, empty_parent, material)
+
+        # Materials read the state of notes into an atlas
+        if self.atlas == "True" and self.visual_type in ("BG", "GD", "LT"):
+            Channel_use_atlas(self, col_obj)
+
+        # Velocity of all notes, keyed in bulk from the events of channel
+        # Useless with an atlas, it already hold the velocity of all notes
+        if self.animate == "True" and self.atlas != "True" and self.visual_type != "PR":
+            Channel_key_velocity(self)
+        elif self.animate == "Runtime":
+            Channel_set_runtime(self)
+
+        if self.keyed_controls:
+            Channel_init_controls(self)
+
+        tag_owner(snapshot, col_name)
+        col_obj['mtb_owner'] = col_name
+        col_obj['mtb_type'] = self.visual_type
+        self.built = True
 
         return None
 
@@ -1382,9 +3072,13 @@ class Channel_Class:
         """
         # Main - add_note_evt - For now suppose all type evt is note_on or note_off
 
+        # Locked channel has no object
+        if self.locked == "True":
+            return None
+
         # Dispatch by type of object
         # Deal with mono object for all notes or multi objects each by note
-        if self.visual_type in ("FS", "SW", "TP"):
+        if self.visual_type in ("FS", "SW", "TP", "PR"):
             obj = self.note_object[0]
         else:
             obj = self.note_object[note]
@@ -1393,16 +3087,12 @@ class Channel_Class:
         # if obj_name not in b_dat.objects:
         #     return None
 
-        if self.locked == "True":
+        # PR is already fully animated with the whole song
+        if self.visual_type == "PR":
             return None
 
         # Animate if needed directly the object
         if self.animate == "True":
-
-            # Animate always custom properties of object
-            obj['velocity'] = velocity
-            obj.keyframe_insert(data_path="""["velocity"]""", frame=frame)
-
             if self.visual_type == "BG":
                 BG_note_evt(self, obj, frame, note, velocity)
             elif self.visual_type == "GD":
@@ -1432,6 +3122,9 @@ class Channel_Class:
         OUT
             None
         """
+        if self.locked == "True" or not self.keyed_controls:
+            return None
+
         obj = self.note_object[128]
 
         # Animate custom properties of object
@@ -1450,6 +3143,9 @@ class Channel_Class:
         OUT
             None
         """
+        if self.locked == "True" or not self.keyed_controls:
+            return None
+
         obj = self.note_object[128]
 
         # Animate custom properties of object
@@ -1468,6 +3164,9 @@ class Channel_Class:
         OUT
             None
         """
+        if self.locked == "True" or not self.keyed_controls:
+            return None
+
         obj = self.note_object[128]
 
         # modulation wheel = 1
@@ -1517,16 +3216,42 @@ filename = "Melody 01"
 # If use_channel = True then manage separate channel as usual, wherever the tracks where the channel event are
 # If use_channel = False then MIDI File don't use channel info and we use 1 track = 1 channel
 use_channel = False
+# quality = "preview" for lightweight proxies, "final" for full quality
+quality = "final"
+# Channel types whose heavy meshes are swapped by a proxy in preview quality
+quality_proxy = ["FT", "FS", "LT"]
+# Max of live particles for all FT channels, 0 mean no limit
+# ft_budget_mode = "COUNT" scale count of particles, "LIFETIME" scale their lifetime
+ft_particle_budget = 0
+ft_budget_mode = "COUNT"
+# scene_cache = True keep the whole build into a .blend, linked by the next build of the same song and config
+# Only the last build of a song is kept
+scene_cache = False
+# channel_cache = True keep each channel built into his own .blend, linked by the next builds
+# Folder of these .blend can be shared by many projects
+channel_cache = False
+# checkpoint = True remember each channel completed, a run stopped before the end resume after it
+# Useful for long builds, each channel is also written into his own .blend (see channel_cache)
+checkpoint = False
+# Time window of a partial build, to preview a section of the song : window_start = None for the whole song
+# window_unit = "seconds", "bars" (first bar = 1) or "frames", the window stop at window_end
+window_start = None
+window_end = None
+window_unit = "seconds"
+pathchannels = path + "\\" + "MTB_channels"
 filemid = path + "\\" + filename + ".mid"
+filedb = path + "\\" + "MIDIBase.db"
 fileaudio = path + "\\" + filename + ".mp3"
+pathcache = path + "\\" + filename + "_cache"
 filejson = path + "\\" + filename + ".json"
 filelog = path + "\\" + filename + ".log"
 
 # Open log file for append
 # flog = open(filelog, "w+")
 
-# Open MIDIFile with the module MIDO
-mid = MidiFile(filemid)
+# Open MIDIFile, decoded only the first time then read back from MIDIBase.db
+base = MIDIBase_Class(filedb)
+mid = base.load(filemid, filename)
 print("Midi type = "+str(mid.type))
 
 # type = 0 - (single track): all messages are in one track and use the same tempo and start at the same time
@@ -1566,6 +3291,31 @@ if os.path.exists(filejson):
 else:
     jsoninit = True
 
+# Scene cache : the same song with the same config is linked from a previous build
+# Only into an empty MTB collection (or one already linked), never with runtime channels
+scene_key = scene_fingerprint(
+    [filemid, filejson] if not jsoninit else [filemid],
+    [mtb_version, b_scn.render.fps, quality, quality_proxy, ft_particle_budget, ft_budget_mode,
+     window_start, window_end, window_unit])
+filescene = os.path.join(pathcache, filename + "_" + scene_key + ".blend")
+scene_cached = False
+use_scene_cache = scene_cache and not jsoninit and all(chan["Animate"] != "Runtime" for chan in mtb_data)
+if new_collec.library and (not use_scene_cache or bpy.path.abspath(new_collec.library.filepath) != filescene):
+    # Linked build of an other version of song
+    b_dat.libraries.remove(new_collec.library)
+    new_collec = create_collection(col_name, b_con.scene.collection, delete=False)
+if new_collec.library:
+    scene_cached = True
+elif use_scene_cache and os.path.exists(filescene) and not new_collec.all_objects:
+    b_dat.collections.remove(new_collec)
+    with b_dat.libraries.load(filescene, link=True) as (data_from, data_to):
+        data_to.collections = [col_name]
+    new_collec = data_to.collections[0]
+    b_con.scene.collection.children.link(new_collec)
+    scene_cached = True
+if scene_cached:
+    print("Scene linked from cache: " + filescene)
+
 # Some musical definitions
 octave = {0: "C", 1: "C#", 2: "D", 3: "D#", 4: "E", 5: "F", 6: "F#", 7: "G", 8: "G#", 9: "A", 10: "A#", 11: "B"}
 
@@ -1617,7 +3367,7 @@ midinote_to_octave = {
 
 # Set pulsation per quarter note (ppq)
 # Mean the number of pulsation per round note / 4 = black note
-ppq = mid.ticks_per_beat
+ppq = mid.ppq
 print("PPQ resolution = " + str(ppq))
 
 # Init Max frame number founded for all channel, mean the end of animation
@@ -1628,10 +3378,29 @@ framerate = b_con.scene.render.fps
 
 # For type 0 and 1 midifile
 # instanciate single time_map
-time_map = Tempo_Class(mid.tracks[0])
+time_map = Tempo_Class(mid.messages)
 print("Tempo count = " + str(len(time_map.tempo_map)))
 
-""" STEP 2 - Creating the 3D channel vizualisation objects """
+# Frame of each message, computed only once by framerate
+msg_frames = base.frames(mid.file_id, framerate)
+if msg_frames is None:
+    msg_frames = [time_map.frame(msg[1]) for msg in mid.messages]
+    base.store_frames(mid.file_id, framerate, msg_frames)
+base.close()
+
+# Messages of the time window only, with the state of notes and controls at his start
+if window_start is not None:
+    ticks_per_bar = ppq * 4 * mid.time_signature[0] // mid.time_signature[1]
+    frame_start = window_frame(window_start, window_unit, time_map, ticks_per_bar)
+    frame_end = max(msg_frames)
+    if window_end is not None:
+        frame_end = window_frame(window_end, window_unit, time_map, ticks_per_bar)
+    print("Time window from frame {:.0f} to {:.0f}".format(frame_start, frame_end))
+    l_messages, l_frames = window_messages(mid.messages, msg_frames, frame_start, frame_end)
+else:
+    l_messages, l_frames = mid.messages, msg_frames
+
+""" STEP 2 - List all channels and their events """
 
 # Dictionnary of Channel <= receive object Channel_Class
 ChannelList = {}
@@ -1642,28 +3411,69 @@ l_channel_notes = {}
 # Fill l_channel with all channels found in all tracks
 # and set some channel parameters
 if use_channel:
-    for current_track, track in enumerate(mid.tracks):
-        for msg in track:
-            if msg.type == ('note_on'):
-                if msg.channel not in l_channel:
-                    l_channel.append(msg.channel)
-                    channel_name[msg.channel] = track.name
-                    l_channel_notes[msg.channel] = []
-                if msg.note not in l_channel_notes[msg.channel]:
-                    l_channel_notes[msg.channel].append(msg.note)
+    for current_track, ticks, msg_type, channel, note, velocity in mid.messages:
+        if msg_type == ('note_on'):
+            if channel not in l_channel:
+                l_channel.append(channel)
+                channel_name[channel] = mid.track_names[current_track]
+                l_channel_notes[channel] = []
+            if note not in l_channel_notes[channel]:
+                l_channel_notes[channel].append(note)
     l_channel = sorted(l_channel)
 else:
-    for current_track, track in enumerate(mid.tracks):
+    for current_track, track_name in enumerate(mid.track_names):
         l_channel.append(current_track)
-        channel_name[current_track] = track.name
+        channel_name[current_track] = track_name
         l_channel_notes[current_track] = []
-        for msg in track:
-            if msg.type == ('note_on'):
-                if msg.note not in l_channel_notes[current_track]:
-                    l_channel_notes[current_track].append(msg.note)
+    for current_track, ticks, msg_type, channel, note, velocity in mid.messages:
+        if msg_type == ('note_on'):
+            if note not in l_channel_notes[current_track]:
+                l_channel_notes[current_track].append(note)
     l_channel = sorted(l_channel)
 
-# Create one vizualisation object per channel
+# Pre-scan all note events, some vizualisations need to plan them before animate
+l_channel_events = scan_note_events(l_messages, l_frames, use_channel)
+
+# Only notes of the time window get an object, all channels are kept
+if window_start is not None:
+    for cur_chan in l_channel:
+        l_channel_notes[cur_chan] = list({evt[1] for evt in l_channel_events.get(cur_chan, [])})
+
+# Planning of particles for all FT channels, scaled to the global budget
+l_ft_events = []
+if not jsoninit:
+    for cur_chan in l_channel:
+        mtb_channel = search_channel_in_mtb_data(cur_chan)
+        if mtb_channel["Type"] == "FT" and mtb_channel["Locked"] != "True" and mtb_channel["Animate"] == "True":
+            l_ft_events.append(l_channel_events.get(cur_chan, []))
+ft_count_scale, ft_lifetime_scale = FT_plan_budget(l_ft_events, ft_particle_budget, ft_budget_mode)
+
+# Runtime channels, filled by Channel_set_runtime
+b_scn["mtb_runtime"] = {}
+
+# Messages of each channel, in the order of tracks
+l_channel_msgs = {}
+for num_msg, (msg_track, ticks, msg_type, channel, data1, data2) in enumerate(l_messages):
+    # Tempo is already into the tempo MAP
+    if msg_type == 'set_tempo':
+        continue
+    # Check real channel following the value of lag use_channel
+    l_channel_msgs.setdefault(channel if use_channel else msg_track, []).append(num_msg)
+
+# Channels completed by a previous run stopped before the end, see checkpoint
+filecheckpoint = os.path.join(pathcache, "checkpoint.json")
+checkpoint_done = {}
+if checkpoint and os.path.exists(filecheckpoint):
+    with open(filecheckpoint, 'r') as f:
+        checkpoint_data = json.load(f)
+    if checkpoint_data["scene_key"] == scene_key:
+        checkpoint_done = checkpoint_data["channels"]
+        max_num_frame = checkpoint_data["max_num_frame"]
+        print("Resume after {} channel(s) completed".format(len(checkpoint_done)))
+
+# flog.write("channel;type;note;velocity;time_ticks;time_in_ticks_cumul;current_tempo;time_in_sec;time_in_sec_Cumul;current_frame\n")
+
+""" STEP 3 - Create one vizualisation object per channel then animate it with all his events """
 for cur_chan in l_channel:
     l_channel_notes[cur_chan] = sorted(l_channel_notes[cur_chan])
     if jsoninit:
@@ -1674,80 +3484,99 @@ for cur_chan in l_channel:
         mtb_channel["Type"] = "BG"
         mtb_channel["Template"] = ""
         mtb_channel["Animate"] = "True"
+        mtb_channel["Backend"] = ""
+        mtb_channel["Atlas"] = "False"
+        mtb_channel["Drivers"] = "False"
+        mtb_channel["Seed"] = cur_chan
         mtb_data.append(mtb_channel)
-        ChannelList[cur_chan] = Channel_Class(cur_chan, l_channel_notes[cur_chan], channel_name[cur_chan], mtb_channel)
+        ChannelList[cur_chan] = Channel_Class(
+            cur_chan, l_channel_notes[cur_chan], channel_name[cur_chan], mtb_channel,
+            l_channel_events.get(cur_chan, []))
     else:
         mtb_channel = search_channel_in_mtb_data(cur_chan)
-        ChannelList[cur_chan] = Channel_Class(cur_chan, l_channel_notes[cur_chan], channel_name[cur_chan], mtb_channel)
+        # Objects are linked from the scene cache, nothing to build or animate
+        if scene_cached:
+            mtb_channel = dict(mtb_channel, Locked="True")
+        ChannelList[cur_chan] = Channel_Class(
+            cur_chan, l_channel_notes[cur_chan], channel_name[cur_chan], mtb_channel,
+            l_channel_events.get(cur_chan, []))
+    cur_channel = ChannelList[cur_chan]
+
+    # Main LOOP on all events of channel
+    nums = l_channel_msgs.get(cur_chan, [])
+    print('Animate channel {}: {} evt(s)'.format(cur_chan, len(nums)))
+    last_frame = Channel_add_events(
+        cur_channel, [l_messages[i] for i in nums], [l_frames[i] for i in nums],
+        frame_start if window_start is not None else 0)
+
+    # Manage the last frame number : mean the end of animation
+    if last_frame > max_num_frame:
+        max_num_frame = last_frame
+
+    # Channel is completed only once all his events are keyed, remember it
+    if cur_channel.built or cur_channel.linked:
+        Channel_remember(cur_channel)
+
+    # Keep each channel built into his own .blend, with his objects, meshes, materials and actions
+    # with the quality of build, linked objects are never changed by set_quality
+    # then remember it is completed
+    if cur_channel.built and cur_channel.animate != "Runtime" and (channel_cache or checkpoint):
+        os.makedirs(pathchannels, exist_ok=True)
+        tag_owner_actions()
+        set_quality(b_dat.collections[cur_channel.col_name], quality)
+        b_dat.libraries.write(
+            Channel_cache_file(cur_channel), {b_dat.collections[cur_channel.col_name]}, fake_user=True)
+        if checkpoint:
+            checkpoint_done[str(cur_chan)] = {"hash": cur_channel.fingerprint, "last_frame": last_frame}
+            os.makedirs(pathcache, exist_ok=True)
+            with open(filecheckpoint, 'w') as f:
+                f.write(json.dumps(
+                    {"scene_key": scene_key, "max_num_frame": max_num_frame, "channels": checkpoint_done}, indent=4))
 
 # Save json file if initialising
 if jsoninit:
     with open(filejson, 'w') as f:
         f.write(json.dumps(mtb_data, indent=4))
 
-# flog.write("channel;type;note;velocity;time_ticks;time_in_ticks_cumul;current_tempo;time_in_sec;time_in_sec_Cumul;current_frame\n")
-
-current_frame = 0
-""" STEP 3 - Main LOOP on midifile track for all events """
-for current_track, track in enumerate(mid.tracks):
-    print('Parse track {}: {} evt(s)'.format(current_track, len(track)))
-
-#   Initialize the time cumul in ticks and second for the track
-    time_in_ticks_cumul = 0
-
-    # Parse midi message for the current track
-    for msg in track:
-
-        if msg.type == "sysex":
-            continue
-
-        time_in_ticks_cumul += msg.time
-
-        if msg.is_meta:
-            continue
-
-        # Check if note_on with velocity 0 will become note_off
-        if (msg.type == 'note_on') and (msg.velocity == 0):
-            msgtype = 'note_off'
-        else:
-            msgtype = msg.type
-
-        # Check real channel following the value of lag use_channel
-        if use_channel:
-            current_channel = msg.channel
-        else:
-            current_channel = current_track
-
-        # If note_on or note_off event
-        if msgtype in ('note_on', 'note_off'):
-            # Evaluate the current frame following Tempo MAP
-            current_frame = time_map.frame(time_in_ticks_cumul)
-            # flog.write(str(msg.channel) + ";" + msgtype + ";" + str(msg.note) + ";" + str(msg.velocity) + ";" + str(msg.time) + ";" + str(time_in_ticks_cumul) + ";" + str(current_frame)+ "\n")
-            velocity = msg.velocity * (msgtype == 'note_on')  # to avoid note_off with velocity != 0
-            ChannelList[current_channel].add_note_evt(msgtype, current_frame, msg.note, velocity)
-        # if pitchwheel event
-        elif msg.type == 'pitchwheel':
-            ChannelList[current_channel].add_pitchwheel_evt(current_frame, msg.pitch)
-        elif msg.type == 'aftertouch':
-            ChannelList[current_channel].add_aftertouch_evt(current_frame, msg.value)
-        elif msg.type == 'control_change':
-            # print("ctrlchg " + str(current_frame) + " " + str(msg.control) + " " + str(msg.value))
-            ChannelList[current_channel].add_ctrlchange_evt(current_frame, msg.control, msg.value)
-        else:
-            print(msg.type)
-
-        # here, later, how to deal with other msg type like
-        # control_change
-        #   sustain pedal (64), stop all notes (123)
-        # program_change
-        # and so on...
-
-    # Manage the last frame number : mean the end of animation
-    if current_frame > max_num_frame:
-        max_num_frame = current_frame
+# Build completed, nothing to resume
+if os.path.exists(filecheckpoint):
+    os.remove(filecheckpoint)
 
 # Add one second at the end of animation
+# A time window change the start of the scene, a full build restore it
 b_scn.frame_end = max_num_frame + framerate
+if window_start is not None:
+    if "mtb_frame_start" not in b_scn:
+        b_scn["mtb_frame_start"] = b_scn.frame_start
+    b_scn.frame_start = int(frame_start)
+elif "mtb_frame_start" in b_scn:
+    b_scn.frame_start = b_scn["mtb_frame_start"]
+    del b_scn["mtb_frame_start"]
+
+# Actions of keyframes are owned by the channel of the object animated
+tag_owner_actions()
+
+# Set quality of all objects generated, also available later without rebuild
+# then keep the build into the scene cache
+if not scene_cached:
+    set_quality(new_collec, quality)
+    if use_scene_cache:
+        os.makedirs(pathcache, exist_ok=True)
+        b_dat.libraries.write(filescene, {new_collec}, fake_user=True)
+        # Builds of other versions of the song are never linked again
+        for file in os.listdir(pathcache):
+            key = file[len(filename) + 1:-len(".blend")]
+            if file.startswith(filename + "_") and file.endswith(".blend") and len(key) == 40 \
+                    and all(c in "0123456789abcdef" for c in key) and key != scene_key:
+                os.remove(os.path.join(pathcache, file))
+bpy.app.driver_namespace["mtb_set_quality"] = set_quality
+
+# Runtime channels are animated by a frame change handler, replace the one of a previous run
+bpy.app.driver_namespace["mtb_runtime"] = runtime_load(b_scn)
+runtime_register()
+if bpy.app.driver_namespace["mtb_runtime"]:
+    runtime_frame_change(b_scn)
+    print("Runtime channels are animated until Blender is closed, run the script again in a new session")
 
 print("Script Finished: %.2f sec" % (time.time() - time_start))
 # flog.close()
@@ -0,0 +1,462 @@
+# ********************************************************************
+# Midi_To_Blend - MIDIBase.db, cache of decoded MIDI files
+# version = 1.011
+# Author = Patrick Mauger
+# Web Site = docouatzat.com
+# Mail = docouatzat@gmail.com
+#
+# Licence used = GNU General Public License V3
+#
+# A MIDI file is decoded only once, the next loads read back his messages
+# from the base with the hash of the file. No dependency on Blender.
+#
+# Also a command line to index a whole folder of MIDI files and query it :
+#   python mtb_base.py index <folder> [--db MIDIBase.db] [--workers N]
+#   python mtb_base.py report [--db MIDIBase.db]
+# ********************************************************************
+
+import os
+import sys
+import sqlite3
+import hashlib
+import datetime
+import argparse
+import multiprocessing
+from mido import MidiFile
+from mtb_index import note_intervals
+
+# Name of notes, for MIDIBar.Bar_Txt
+note_names = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+# Status of messages stored into MIDIMsg.Msg_Type, meta messages have their meta type
+msg_status = {
+    'note_off': 0x80, 'note_on': 0x90, 'polytouch': 0xA0, 'control_change': 0xB0,
+    'program_change': 0xC0, 'aftertouch': 0xD0, 'pitchwheel': 0xE0, 'set_tempo': 0x51
+}
+
+schema = """
+    CREATE TABLE IF NOT EXISTS `MIDIFile` (
+        `MIDIFile_id`   INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+        `name`  TEXT,
+        'hash'  TEXT,
+        `TS_Numerator`  INTEGER,
+        `TS_Denominator`    INTEGER,
+        `ClockPerBeat`  INTEGER,
+        `N32PB` INTEGER,
+        `cr_date`   TEXT
+    );
+    CREATE INDEX IF NOT EXISTS MIDIFile_Midifile_id ON MIDIFile (MIDIFile_id);
+    CREATE TABLE IF NOT EXISTS MIDITrack(
+        Track_id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+        TrackNum INTEGER,
+        name TEXT,
+        MIDIFile_id INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS MIDITrack_MIDIFile_id ON MIDITrack (MIDIFile_id);
+    CREATE TABLE IF NOT EXISTS `MIDIMsg` (
+        `MIDIFile_Id`   INTEGER,
+        `Track_Num` INTEGER,
+        `Msg_Num`   INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+        `Msg_Msg`   TEXT,
+        `Msg_Type`  INTEGER,
+        `Msg_channel`   INTEGER,
+        `Msg_note`  INTEGER,
+        `Msg_time`  INTEGER,
+        `Msg_velocity`  INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS MIDIMsg_Idx ON MIDIMsg (MIDIFile_Id, Track_Num, Msg_Num);
+    CREATE INDEX IF NOT EXISTS MIDIMsg_Type ON MIDIMsg (MIDIFile_Id, Msg_Msg, Track_Num);
+    CREATE TABLE IF NOT EXISTS `MIDIBar` (
+        `MIDIFile_Id`   INTEGER,
+        `Track_Id`  INTEGER,
+        `Bar_Num`   INTEGER,
+        `Bar_Txt`   TEXT
+    );
+    CREATE INDEX IF NOT EXISTS MIDIBar_Idx ON MIDIBar (MIDIFile_Id, Track_Id, Bar_Num);
+    CREATE TABLE IF NOT EXISTS MIDIFrame (
+        MIDIFile_Id INTEGER,
+        Fps INTEGER,
+        Msg_Num INTEGER,
+        Frame REAL
+    );
+    CREATE INDEX IF NOT EXISTS MIDIFrame_Idx ON MIDIFrame (MIDIFile_Id, Fps, Msg_Num);
+"""
+
+# Columns added to the first version of MIDIBase.db
+added_columns = {
+    "MIDIFile": [("Ticks_Per_Beat", "INTEGER"), ("MIDI_Type", "INTEGER")]
+}
+
+
+def file_hash(filemid):
+    """ Hash of the content of a file, sha1 in hexa """
+    with open(filemid, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def decode_midi(filemid):
+    """ Decode a MIDI file into a message table
+    Time of each message is the cumul of ticks into his track
+    Meta messages are dropped except set_tempo, so are sysex
+    IN
+        filemid     str     path of MIDI file
+    OUT
+        dict    file infos, see MIDISong_Class for keys
+    """
+    mid = MidiFile(filemid)
+    song = {
+        "type": mid.type,
+        "ppq": mid.ticks_per_beat,
+        "time_signature": (4, 4, 24, 8),
+        "track_names": [track.name for track in mid.tracks],
+        "messages": []
+    }
+    signature_found = False
+    for current_track, track in enumerate(mid.tracks):
+        time_in_ticks_cumul = 0
+        for msg in track:
+            time_in_ticks_cumul += msg.time
+            if msg.type == 'time_signature' and not signature_found:
+                song["time_signature"] = (
+                    msg.numerator, msg.denominator, msg.clocks_per_click, msg.notated_32nd_notes_per_beat)
+                signature_found = True
+            if msg.type == 'sysex' or (msg.is_meta and msg.type != 'set_tempo'):
+                continue
+            if msg.type in ('note_on', 'note_off', 'polytouch'):
+                data = (msg.note, msg.velocity if msg.type != 'polytouch' else msg.value)
+            elif msg.type == 'control_change':
+                data = (msg.control, msg.value)
+            elif msg.type == 'pitchwheel':
+                data = (msg.pitch, 0)
+            elif msg.type == 'aftertouch':
+                data = (msg.value, 0)
+            elif msg.type == 'program_change':
+                data = (msg.program, 0)
+            elif msg.type == 'set_tempo':
+                data = (msg.tempo, 0)
+            else:
+                data = (0, 0)
+            channel = getattr(msg, 'channel', None)
+            song["messages"].append((current_track, time_in_ticks_cumul, msg.type, channel) + data)
+
+    return song
+
+
+def hash_file_safe(filemid):
+    """ Hash a file, for the workers of index_corpus
+    OUT
+        (filemid, hash or None, error or None)
+    """
+    try:
+        return filemid, file_hash(filemid), None
+    except OSError as e:
+        return filemid, None, str(e)
+
+
+def decode_file(job):
+    """ Decode a MIDI file already hashed, for the workers of index_corpus
+    IN
+        job     tuple   (filemid, hash)
+    OUT
+        (filemid, hash, song or None, error or None)
+    """
+    filemid, hash_file = job
+    try:
+        return filemid, hash_file, decode_midi(filemid), None
+    except Exception as e:
+        return filemid, hash_file, None, str(e)
+
+
+def note_bars(song):
+    """ Notes played into each bar of each track, bars follow the first time signature
+    IN
+        song    dict    see decode_midi
+    OUT
+        list    [(track, bar number from 1, "C4 E4 G4"), ...]
+    """
+    numerator, denominator = song["time_signature"][0:2]
+    ticks_per_bar = max(1, song["ppq"] * 4 * numerator // denominator)
+    bars = {}
+    for track, ticks, msg_type, channel, note, velocity in song["messages"]:
+        if msg_type == 'note_on' and velocity > 0:
+            name = note_names[note % 12] + str(note // 12 - 1)
+            bars.setdefault((track, ticks // ticks_per_bar + 1), []).append(name)
+    return [(track, bar, " ".join(names)) for (track, bar), names in sorted(bars.items())]
+
+
+class MIDISong_Class:
+
+    def __init__(self, file_id, song):
+        """
+        Initialization of the Class MIDISong_Class, a MIDI file decoded
+        IN
+            file_id     int     MIDIFile_id into MIDIBase.db
+            song        dict    see decode_midi
+        OUT
+            The new object instanciated
+        """
+        self.file_id = file_id
+        self.type = song["type"]                    # 0, 1 or 2
+        self.ppq = song["ppq"]                      # ticks per beat
+        self.time_signature = song["time_signature"]    # first time signature (num, den, clocks, 32nd)
+        self.track_names = song["track_names"]      # name of each track
+        # [(track, ticks_cumul, type, channel, data1, data2), ...] in the order of tracks
+        # note_on, note_off  : data1 = note, data2 = velocity
+        # control_change     : data1 = control, data2 = value
+        # pitchwheel         : data1 = pitch
+        # aftertouch         : data1 = value
+        # set_tempo          : data1 = tempo
+        self.messages = song["messages"]
+
+
+class MIDIBase_Class:
+
+    def __init__(self, filedb):
+        """
+        Initialization of the Class MIDIBase_Class, open (create if needed) the base
+        IN
+            filedb      str     path of MIDIBase.db
+        OUT
+            The new object instanciated
+        """
+        self.con = sqlite3.connect(filedb)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(schema)
+        for table, columns in added_columns.items():
+            existing = [row[1] for row in self.con.execute("PRAGMA table_info({})".format(table))]
+            for name, sql_type in columns:
+                if name not in existing:
+                    self.con.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, name, sql_type))
+        self.con.execute("CREATE INDEX IF NOT EXISTS MIDIFile_hash ON MIDIFile (hash)")
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+    def find(self, hash_file):
+        """ MIDIFile_id of a file already stored, else None """
+        row = self.con.execute("SELECT MIDIFile_id FROM MIDIFile WHERE hash = ?", (hash_file,)).fetchone()
+        return row[0] if row else None
+
+    def store(self, name, hash_file, song):
+        """
+        Store a file decoded, all his tracks and messages into one transaction
+        IN
+            name        str     name of file
+            hash_file   str     see file_hash
+            song        dict    see decode_midi
+        OUT
+            int     MIDIFile_id
+        """
+        with self.con:
+            cursor = self.con.execute(
+                """INSERT INTO MIDIFile (name, hash, TS_Numerator, TS_Denominator, ClockPerBeat, N32PB,
+                cr_date, Ticks_Per_Beat, MIDI_Type) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (name, hash_file) + tuple(song["time_signature"])
+                + (datetime.datetime.now().isoformat(), song["ppq"], song["type"]))
+            file_id = cursor.lastrowid
+            self.con.executemany(
+                "INSERT INTO MIDITrack (TrackNum, name, MIDIFile_id) VALUES (?, ?, ?)",
+                [(num, track_name, file_id) for num, track_name in enumerate(song["track_names"])])
+            self.con.executemany(
+                """INSERT INTO MIDIMsg (MIDIFile_Id, Track_Num, Msg_time, Msg_Msg, Msg_Type, Msg_channel,
+                Msg_note, Msg_velocity) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(file_id, track, ticks, msg_type, msg_status.get(msg_type, 0), channel, data1, data2)
+                 for track, ticks, msg_type, channel, data1, data2 in song["messages"]])
+            track_ids = dict(self.con.execute(
+                "SELECT TrackNum, Track_id FROM MIDITrack WHERE MIDIFile_id = ?", (file_id,)))
+            self.con.executemany(
+                "INSERT INTO MIDIBar (MIDIFile_Id, Track_Id, Bar_Num, Bar_Txt) VALUES (?, ?, ?, ?)",
+                [(file_id, track_ids[track], bar, text) for track, bar, text in note_bars(song)])
+        return file_id
+
+    def read(self, file_id):
+        """ Read back a file stored, see decode_midi for the content """
+        row = self.con.execute(
+            """SELECT TS_Numerator, TS_Denominator, ClockPerBeat, N32PB, Ticks_Per_Beat, MIDI_Type
+            FROM MIDIFile WHERE MIDIFile_id = ?""", (file_id,)).fetchone()
+        song = {
+            "type": row[5],
+            "ppq": row[4],
+            "time_signature": tuple(row[0:4]),
+            "track_names": [track_name for (track_name,) in self.con.execute(
+                "SELECT name FROM MIDITrack WHERE MIDIFile_id = ? ORDER BY TrackNum", (file_id,))],
+            "messages": self.con.execute(
+                """SELECT Track_Num, Msg_time, Msg_Msg, Msg_channel, Msg_note, Msg_velocity
+                FROM MIDIMsg WHERE MIDIFile_Id = ? ORDER BY Track_Num, Msg_Num""", (file_id,)).fetchall()
+        }
+        return song
+
+    def load(self, filemid, name):
+        """
+        Load a MIDI file, decoded only if not yet into the base
+        IN
+            filemid     str     path of MIDI file
+            name        str     name of file stored
+        OUT
+            MIDISong_Class
+        """
+        hash_file = file_hash(filemid)
+        file_id = self.find(hash_file)
+        if file_id is None:
+            song = decode_midi(filemid)
+            file_id = self.store(name, hash_file, song)
+        else:
+            song = self.read(file_id)
+        return MIDISong_Class(file_id, song)
+
+    def frames(self, file_id, fps):
+        """ Frame of each message for a fps, in the order of messages, or None if not yet stored """
+        frames = [frame for (frame,) in self.con.execute(
+            """SELECT Frame FROM MIDIFrame WHERE MIDIFile_Id = ? AND Fps = ?
+            ORDER BY Msg_Num""", (file_id, fps))]
+        return frames if frames else None
+
+    def store_frames(self, file_id, fps, frames):
+        """ Store the frame of each message for a fps, frames are in the order of messages """
+        msg_nums = [msg_num for (msg_num,) in self.con.execute(
+            "SELECT Msg_Num FROM MIDIMsg WHERE MIDIFile_Id = ? ORDER BY Track_Num, Msg_Num", (file_id,))]
+        with self.con:
+            self.con.execute("DELETE FROM MIDIFrame WHERE MIDIFile_Id = ? AND Fps = ?", (file_id, fps))
+            self.con.executemany(
+                "INSERT INTO MIDIFrame (MIDIFile_Id, Fps, Msg_Num, Frame) VALUES (?, ?, ?, ?)",
+                [(file_id, fps, msg_num, frame) for msg_num, frame in zip(msg_nums, frames)])
+        return None
+
+    """ ======= Analytics ========================================== """
+
+    def files(self):
+        """ All files stored [(MIDIFile_id, name), ...] """
+        return self.con.execute("SELECT MIDIFile_id, name FROM MIDIFile ORDER BY name").fetchall()
+
+    def note_range(self, file_id):
+        """ Lower note, highest note and count of notes of each track {track: (min, max, count)} """
+        rows = self.con.execute(
+            """SELECT Track_Num, MIN(Msg_note), MAX(Msg_note), COUNT(*) FROM MIDIMsg
+            WHERE MIDIFile_Id = ? AND Msg_Msg = 'note_on' AND Msg_velocity > 0
+            GROUP BY Track_Num""", (file_id,))
+        return {row[0]: row[1:] for row in rows}
+
+    def event_density(self, file_id):
+        """ Notes by beat of each track {track: notes by beat}, along the whole song """
+        ppq = self.con.execute(
+            "SELECT Ticks_Per_Beat FROM MIDIFile WHERE MIDIFile_id = ?", (file_id,)).fetchone()[0]
+        length = self.con.execute(
+            "SELECT MAX(Msg_time) FROM MIDIMsg WHERE MIDIFile_Id = ?", (file_id,)).fetchone()[0] or 0
+        beats = max(1, length / ppq)
+        return {track: count / beats for track, (low, high, count) in self.note_range(file_id).items()}
+
+    def tempo_changes(self, file_id):
+        """ Count of tempo changes, the first tempo included """
+        return self.con.execute(
+            """SELECT COUNT(*) FROM MIDIMsg
+            WHERE MIDIFile_Id = ? AND Msg_Msg = 'set_tempo'""", (file_id,)).fetchone()[0]
+
+    def polyphony(self, file_id):
+        """ Max of notes sounding at the same time of each track {track: max} """
+        events = {}
+        for track, ticks, msg_type, note, velocity in self.con.execute(
+                """SELECT Track_Num, Msg_time, Msg_Msg, Msg_note, Msg_velocity FROM MIDIMsg
+                WHERE MIDIFile_Id = ? AND Msg_Msg IN ('note_on', 'note_off')
+                ORDER BY Track_Num, Msg_time, Msg_Num""", (file_id,)):
+            events.setdefault(track, []).append([ticks, note, velocity * (msg_type == 'note_on')])
+
+        result = {}
+        for track, track_events in events.items():
+            # Sweep of starts and ends, an end before a start at the same time
+            sweep = []
+            for note, start, end, velocity in note_intervals(track_events):
+                sweep.append((start, 1))
+                sweep.append((end, -1))
+            sweep.sort()
+            current = maximum = 0
+            for ticks, step in sweep:
+                current += step
+                maximum = max(maximum, current)
+            result[track] = maximum
+        return result
+
+    def report(self):
+        """ One line by track of all files stored, to choose vizualisations and estimate builds """
+        lines = ["file;track;name;low;high;notes;notes_by_beat;polyphony;tempo_changes"]
+        for file_id, name in self.files():
+            track_names = dict(self.con.execute(
+                "SELECT TrackNum, name FROM MIDITrack WHERE MIDIFile_id = ?", (file_id,)))
+            density = self.event_density(file_id)
+            poly = self.polyphony(file_id)
+            tempo = self.tempo_changes(file_id)
+            for track, (low, high, count) in sorted(self.note_range(file_id).items()):
+                lines.append("{};{};{};{};{};{};{:.2f};{};{}".format(
+                    name, track, track_names.get(track, ""), low, high, count, density[track], poly[track], tempo))
+        return lines
+
+
+def index_corpus(filedb, folder, workers):
+    """
+    Add all MIDI files of a folder (and sub folders) into MIDIBase.db
+    Files are hashed and decoded by many processes, only the new ones are stored
+    IN
+        filedb      str     path of MIDIBase.db
+        folder      str     root folder of MIDI files
+        workers     int     count of processes
+    OUT
+        (count of files stored, count of files already known, list of errors)
+    """
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.lower().endswith(('.mid', '.midi')):
+                paths.append(os.path.join(root, file))
+
+    base = MIDIBase_Class(filedb)
+    with multiprocessing.Pool(workers) as pool:
+        # Each file is hashed only once, an unreadable file is reported and skipped
+        new_paths = {}
+        new_hashes = set()
+        errors = []
+        known = 0
+        for filemid, hash_file, error in pool.imap(hash_file_safe, paths):
+            if error:
+                errors.append(filemid + ": " + error)
+            elif base.find(hash_file) is not None or hash_file in new_hashes:
+                known += 1
+            else:
+                new_paths[filemid] = hash_file
+                new_hashes.add(hash_file)
+        stored = 0
+        for filemid, hash_file, song, error in pool.imap_unordered(decode_file, new_paths.items()):
+            if error:
+                errors.append(filemid + ": " + error)
+                continue
+            base.store(os.path.splitext(os.path.basename(filemid))[0], hash_file, song)
+            stored += 1
+    base.close()
+
+    return stored, known, errors
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Index MIDI files into MIDIBase.db and query them")
+    parser.add_argument("command", choices=["index", "report"])
+    parser.add_argument("folder", nargs="?", default=".", help="folder of MIDI files for index")
+    parser.add_argument("--db", default="MIDIBase.db", help="path of MIDIBase.db")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="count of processes for index")
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        stored, known, errors = index_corpus(args.db, args.folder, args.workers)
+        print("{} file(s) stored, {} already known".format(stored, known))
+        for error in errors:
+            print("Error " + error)
+    else:
+        base = MIDIBase_Class(args.db)
+        for line in base.report():
+            print(line)
+        base.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
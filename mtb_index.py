@@ -0,0 +1,153 @@
+# ********************************************************************
+# Midi_To_Blend - Note interval index
+# version = 1.011
+# Author = Patrick Mauger
+# Web Site = docouatzat.com
+# Mail = docouatzat@gmail.com
+#
+# Licence used = GNU General Public License V3
+#
+# Pure python, no dependency on Blender : usable into or outside Blender
+# ********************************************************************
+
+import bisect
+
+
+def note_intervals(events):
+    """ Pair note_on and note_off events into note intervals
+    A note_on on a note already sounding close the previous interval
+    IN
+        events      list    [[frame, note, velocity], ...] sorted by frame
+    OUT
+        list    [[note, frame_on, frame_off, velocity], ...] sorted by frame_on
+    """
+    intervals = []
+    opened = {}  # {note: [frame_on, velocity]}
+    last_frame = 0
+    for frame, note, velocity in events:
+        last_frame = frame
+        if note in opened:
+            frame_on, vel = opened.pop(note)
+            intervals.append([note, frame_on, frame, vel])
+        if velocity != 0:
+            opened[note] = [frame, velocity]
+
+    # Notes never released are closed with the last event
+    for note, (frame_on, vel) in opened.items():
+        intervals.append([note, frame_on, last_frame, vel])
+
+    intervals.sort(key=lambda itv: itv[1])
+    return intervals
+
+
+class Interval_Class:
+
+    def __init__(self, intervals):
+        """
+        Initialization of the Class Interval_Class, a centered interval tree
+        A note is sounding on [frame_on, frame_off[, empty intervals are never sounding
+        Each node keep the intervals crossing his center, sorted by start and by end,
+        so point and range queries cost O(log n + k)
+        IN
+            intervals   list    [[note, frame_on, frame_off, velocity], ...], see note_intervals
+        OUT
+            The new object instanciated
+        """
+        self.intervals = sorted((itv for itv in intervals if itv[1] < itv[2]), key=lambda itv: itv[1])
+        self.nodes = []     # [center, by_start, starts, by_end, ends, left, right], -1 = no child
+        self.root = self.build(list(range(len(self.intervals))))
+
+    def build(self, indexes):
+        """
+        Build the node of a list of intervals and his children, return his number or -1
+        """
+        if not indexes:
+            return -1
+        itv = self.intervals
+        starts = sorted(itv[i][1] for i in indexes)
+        center = starts[len(starts) // 2]
+
+        left = [i for i in indexes if itv[i][2] <= center]
+        right = [i for i in indexes if itv[i][1] > center]
+        middle = [i for i in indexes if itv[i][1] <= center < itv[i][2]]
+
+        by_start = sorted(middle, key=lambda i: itv[i][1])
+        by_end = sorted(middle, key=lambda i: -itv[i][2])
+        node = [
+            center,
+            by_start,
+            [itv[i][1] for i in by_start],
+            by_end,
+            [-itv[i][2] for i in by_end],
+            -1,
+            -1
+        ]
+        self.nodes.append(node)
+        num_node = len(self.nodes) - 1
+        node[5] = self.build(left)
+        node[6] = self.build(right)
+        return num_node
+
+    def at(self, frame):
+        """
+        Intervals sounding at frame
+        IN
+            frame       float   frame number
+        OUT
+            list    [[note, frame_on, frame_off, velocity], ...]
+        """
+        found = []
+        num_node = self.root
+        while num_node != -1:
+            center, by_start, starts, by_end, ends, left, right = self.nodes[num_node]
+            if frame < center:
+                # All intervals of node end after center, only start is checked
+                found.extend(by_start[:bisect.bisect_right(starts, frame)])
+                num_node = left
+            elif frame > center:
+                # All intervals of node start before center, only end is checked
+                found.extend(by_end[:bisect.bisect_left(ends, -frame)])
+                num_node = right
+            else:
+                found.extend(by_start)
+                num_node = -1
+        return [self.intervals[i] for i in found]
+
+    def between(self, frame_start, frame_end):
+        """
+        Intervals sounding at least one time into [frame_start, frame_end[
+        IN
+            frame_start     float   first frame of window
+            frame_end       float   end of window, excluded
+        OUT
+            list    [[note, frame_on, frame_off, velocity], ...] sorted by frame_on
+        """
+        found = []
+        stack = [self.root]
+        while stack:
+            num_node = stack.pop()
+            if num_node == -1:
+                continue
+            center, by_start, starts, by_end, ends, left, right = self.nodes[num_node]
+            if center < frame_start:
+                found.extend(by_end[:bisect.bisect_left(ends, -frame_start)])
+                stack.append(right)
+            elif center >= frame_end:
+                found.extend(by_start[:bisect.bisect_left(starts, frame_end)])
+                stack.append(left)
+            else:
+                found.extend(by_start)
+                stack.append(left)
+                stack.append(right)
+        found.sort()
+        return [self.intervals[i] for i in found]
+
+    def notes_at(self, frame):
+        """
+        Velocity of notes sounding at frame
+        IN
+            frame       float   frame number
+        OUT
+            dict    {note: velocity}
+        """
+        return {itv[0]: itv[3] for itv in self.at(frame)}